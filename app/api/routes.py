@@ -1,13 +1,51 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+import json
+import logging
+from typing import AsyncIterator
+
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 from app.api.schemas import AnalyzeResponse
+from app.core.config import settings
+from app.inference.client import ModelServerError, ModelServerTimeout, ModelServerUnavailable, server_stats
 from app.services.analyzer_service import AnalyzerService
+from app.services.memory_budget import AdmissionTimeout, memory_budget
+
+log = logging.getLogger("api")
 
 router = APIRouter()
 
+SUPPORTED_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac", ".ogg")
+
+
+def _check_upload(file: UploadFile) -> None:
+    if not file.filename.lower().endswith(SUPPORTED_EXTENSIONS):
+        raise HTTPException(status_code=400, detail="Unsupported file type. Upload mp3/wav/m4a/flac/ogg")
+
 @router.get("/health")
 def health():
     return {"status": "ok"}
 
+@router.get("/model-server/stats")
+def model_server_stats():
+    """
+    Paylaşılan musicnn server'ının queue depth / batch size metrikleri.
+    """
+    if not settings.inference_socket:
+        return {"configured": False, "available": False}
+    try:
+        stats = server_stats(settings.inference_socket)
+    except (ModelServerUnavailable, ModelServerError, ModelServerTimeout) as e:
+        return {"configured": True, "available": False, "error": str(e)}
+    return {"configured": True, "available": True, "stats": stats}
+
+@router.get("/memory/stats")
+def memory_stats():
+    """
+    Bellek bütçesi: rezerve/bekleyen istekler, kalibrasyon, son tahmin vs ölçüm kayıtları.
+    """
+    return memory_budget.stats()
+
 @router.post("/analyze", response_model=AnalyzeResponse)
 async def analyze(
     file: UploadFile = File(...),
@@ -15,14 +53,95 @@ async def analyze(
     include_instruments: bool = Query(True),
     include_segments: bool = Query(False),
 ):
-    if not file.filename.lower().endswith((".mp3", ".wav", ".m4a", ".flac", ".ogg")):
-        raise HTTPException(status_code=400, detail="Unsupported file type. Upload mp3/wav/m4a/flac/ogg")
+    _check_upload(file)
 
     service = AnalyzerService()
-    result = await service.analyze_upload(
+    try:
+        result = await service.analyze_upload(
+            upload=file,
+            preset=preset,
+            include_instruments=include_instruments,
+            include_segments=include_segments,
+        )
+    except AdmissionTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return result
+
+def _format_event(name: str, payload: dict, fmt: str) -> str:
+    data = json.dumps(payload, default=str)
+    if fmt == "ndjson":
+        return json.dumps({"event": name, "data": payload}, default=str) + "\n"
+    return f"event: {name}\ndata: {data}\n\n"
+
+@router.post("/analyze/stream")
+async def analyze_stream(
+    file: UploadFile = File(...),
+    preset: str = Query("full", pattern="^(fast|full)$"),
+    include_instruments: bool = Query(True),
+    include_segments: bool = Query(False),
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+):
+    """
+    /analyze'ın progressive versiyonu. İlk event "track" decode'dan önce
+    ffprobe süresiyle gelir (probe başarısızsa duration_sec null), bellek
+    bütçesi doluysa ardından "queued"; sonra her stage bittikçe bir event
+    (loudness, tempo, key, audio_features, genre_mood, ai_summary); son event
+    "result" AnalyzeResponse'un tamamı (decode edilmiş süreyle). Hata olursa "error" event'i.
+    """
+    _check_upload(file)
+
+    service = AnalyzerService()
+    events = await service.analyze_upload_events(
         upload=file,
         preset=preset,
         include_instruments=include_instruments,
         include_segments=include_segments,
     )
-    return result
+
+    async def body() -> AsyncIterator[str]:
+        async for name, payload in events:
+            if name == "result":
+                # /analyze ile aynı şema filtrelemesi (response_model); stream
+                # yarıda kopmasın, dokümante edilen "error" event'i gelsin
+                try:
+                    payload = AnalyzeResponse.model_validate(payload).model_dump(mode="json")
+                except ValidationError as e:
+                    log.exception("analyze stream: result failed schema validation")
+                    name, payload = "error", {"status": 500, "detail": f"result validation failed: {e}"}
+            yield _format_event(name, payload, format)
+
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/event-stream"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/analyze/frames")
+async def analyze_frames(
+    file: UploadFile = File(...),
+    decimate: int = Query(1, ge=1, le=256),
+    dtype: str = Query("float16", pattern="^(float16|float32)$"),
+    include_taggram: bool = Query(False),
+):
+    """
+    Frame-level zaman serileri (rms, centroid, rolloff, flatness, zcr,
+    onset_strength, chroma, opsiyonel taggram) -> np.load ile açılan .npz.
+    """
+    _check_upload(file)
+
+    service = AnalyzerService()
+    try:
+        payload = await service.analyze_frames(
+            upload=file,
+            decimate=decimate,
+            dtype=dtype,
+            include_taggram=include_taggram,
+        )
+    except AdmissionTimeout as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "30"})
+    return Response(
+        content=payload,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": 'attachment; filename="frames.npz"'},
+    )
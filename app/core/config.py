@@ -1,7 +1,24 @@
+import os
 from pydantic import BaseModel
 
 class Settings(BaseModel):
     tmp_dir: str = "/tmp/audio-analyzer"
     target_sr: int = 44100
+    # stage ara çıktıları için kalıcı store (boşsa kapalı)
+    feature_store_dir: str | None = os.getenv("FEATURE_STORE_DIR") or None
+    # paylaşılan musicnn model server'ı (app.inference.server); boşsa yerel extractor
+    inference_socket: str | None = os.getenv("INFERENCE_SOCKET") or None
+    # server'a bağlanılamazsa bu kadar sonra yerel fallback'e düşülür
+    inference_connect_timeout_sec: float = float(os.getenv("INFERENCE_CONNECT_TIMEOUT_SEC", "2"))
+    # cevap timeout'u = kuyruk beklemesi payı + patch başına süre (yavaş server'da fallback yok)
+    inference_queue_wait_sec: float = float(os.getenv("INFERENCE_QUEUE_WAIT_SEC", "30"))
+    inference_sec_per_patch: float = float(os.getenv("INFERENCE_SEC_PER_PATCH", "0.05"))
+    # process başına analiz bellek bütçesi (admission control)
+    memory_budget_mb: int = int(os.getenv("MEMORY_BUDGET_MB", "4096"))
+    memory_queue_timeout_sec: float = 300.0
+    # ffprobe süre veremezse tahmin için varsayılan süre
+    memory_unknown_duration_sec: float = 600.0
+    # tempo/key HPSS median filtresi: "exact" | "fast" (preset=fast her zaman "fast")
+    hpss_mode: str = os.getenv("HPSS_MODE", "exact")
 
 settings = Settings()
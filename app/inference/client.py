@@ -0,0 +1,122 @@
+# app/inference/client.py
+"""
+Model server istemcisi + wire protokolü.
+
+Mesaj: 4 byte big-endian header uzunluğu | JSON header | ham numpy payload.
+    request  {"op": "predict", "shape": [...], "dtype": "float16", "timeout_sec": t} + patch'ler
+    response {"ok": true, "shape": [...], "dtype": "float32", "tags": [...]} + olasılıklar
+    request  {"op": "stats"}  -> response {"ok": true, "stats": {...}}
+Hata: {"ok": false, "error": "..."} (payload yok).
+
+Timeout'lar ikiye ayrı: connect kısa ("server kapalı" hızlı anlaşılsın ->
+çağıran yerel modele düşer); cevap timeout'u patch sayısıyla + kuyruk beklemesi
+payıyla ölçeklenir. Bağlanıp cevap bekleyen istek yavaş ama sağlıklı bir
+server'dadır: yerel modele düşmek her worker'a yük altında kendi TF kopyasını
+yükletirdi. timeout_sec server'a da gider; süresi geçmiş istek batch'e alınmaz.
+"""
+from __future__ import annotations
+
+import json
+import socket
+import struct
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+HEADER_LEN = struct.Struct(">I")
+
+
+class ModelServerUnavailable(RuntimeError):
+    """Socket yok / bağlantı reddedildi / timeout: çağıran yerel modele düşmeli."""
+
+
+class ModelServerError(RuntimeError):
+    """Server cevap verdi ama inference başarısız oldu."""
+
+
+class ModelServerTimeout(RuntimeError):
+    """Bağlantı kuruldu ama cevap süresinde gelmedi (server meşgul): yerel modele düşülmez."""
+
+
+def encode_message(header: Dict[str, Any], payload: bytes = b"") -> bytes:
+    h = json.dumps(header).encode()
+    return HEADER_LEN.pack(len(h)) + h + HEADER_LEN.pack(len(payload)) + payload
+
+
+def _recv_exact(sock: socket.socket, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("model server closed connection")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def _recv_message(sock: socket.socket) -> Tuple[Dict[str, Any], bytes]:
+    (hlen,) = HEADER_LEN.unpack(_recv_exact(sock, HEADER_LEN.size))
+    header = json.loads(_recv_exact(sock, hlen))
+    (plen,) = HEADER_LEN.unpack(_recv_exact(sock, HEADER_LEN.size))
+    payload = _recv_exact(sock, plen) if plen else b""
+    return header, payload
+
+
+def _call(
+    socket_path: str,
+    header: Dict[str, Any],
+    payload: bytes,
+    connect_timeout_sec: float,
+    response_timeout_sec: float,
+) -> Tuple[Dict[str, Any], bytes]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(connect_timeout_sec)
+        try:
+            sock.connect(socket_path)
+        except OSError as e:
+            raise ModelServerUnavailable(f"model server {socket_path}: {e}") from e
+
+        sock.settimeout(response_timeout_sec)
+        try:
+            sock.sendall(encode_message(header, payload))
+            resp, data = _recv_message(sock)
+        except socket.timeout as e:
+            raise ModelServerTimeout(
+                f"model server {socket_path}: no response within {response_timeout_sec:.1f}s"
+            ) from e
+        except (OSError, ConnectionError) as e:
+            # bağlandıktan sonra kopan bağlantı: server çöktü / yeniden başlıyor
+            raise ModelServerUnavailable(f"model server {socket_path}: {e}") from e
+
+    if not resp.get("ok"):
+        raise ModelServerError(resp.get("error", "unknown model server error"))
+    return resp, data
+
+
+def response_timeout(n_patches: int, queue_wait_sec: float, sec_per_patch: float) -> float:
+    """Cevap timeout'u: diğer worker'ların önde bekleyen batch'leri için pay + kendi patch'leri."""
+    return queue_wait_sec + sec_per_patch * n_patches
+
+
+def predict_remote(
+    socket_path: str,
+    patches: np.ndarray,
+    connect_timeout_sec: float = 2.0,
+    queue_wait_sec: float = 30.0,
+    sec_per_patch: float = 0.05,
+) -> Tuple[np.ndarray, List[str]]:
+    """
+    Patch'leri (n, frames, mels) server'a gönderir; server diğer worker'ların
+    istekleriyle birlikte batch'ler. Returns (taggram (n, n_tags), tags).
+    """
+    patches = np.ascontiguousarray(patches, dtype=np.float16)
+    timeout_sec = response_timeout(patches.shape[0], queue_wait_sec, sec_per_patch)
+    header = {"op": "predict", "shape": list(patches.shape), "dtype": "float16", "timeout_sec": timeout_sec}
+    resp, data = _call(socket_path, header, patches.tobytes(), connect_timeout_sec, timeout_sec)
+
+    taggram = np.frombuffer(data, dtype=resp["dtype"]).reshape(resp["shape"])
+    return taggram, [str(t) for t in resp["tags"]]
+
+
+def server_stats(socket_path: str, timeout_sec: float = 2.0) -> Dict[str, Any]:
+    resp, _ = _call(socket_path, {"op": "stats"}, b"", timeout_sec, timeout_sec)
+    return resp["stats"]
@@ -0,0 +1,86 @@
+# app/inference/musicnn_model.py
+"""
+musicnn ön-işleme ve model yükleme.
+
+musicnn.extractor her çağrıda graph + session kurar ve TF'i import eden her
+process kendi kopyasını tutar. Burada ön-işleme (mel patch'leri) TF'siz
+yapılır, model tek bir process'te (model server) bir kere yüklenir.
+Sabitler musicnn.configuration ile aynı olmalı.
+"""
+from __future__ import annotations
+
+import os
+from typing import List
+
+import librosa
+import numpy as np
+
+MUSICNN_SR = 16000
+MUSICNN_FFT_HOP = 256
+MUSICNN_FFT_SIZE = 512
+MUSICNN_N_MELS = 96
+INPUT_LENGTH_SEC = 3
+DEFAULT_MODEL = "MSD_musicnn"
+
+# 3 sn'lik patch'in frame sayısı (musicnn.extractor ile aynı hesap)
+PATCH_FRAMES = int(
+    librosa.time_to_frames(INPUT_LENGTH_SEC, sr=MUSICNN_SR, n_fft=MUSICNN_FFT_SIZE, hop_length=MUSICNN_FFT_HOP)
+) + 1
+
+
+def compute_patches(wav_path: str) -> np.ndarray:
+    """
+    musicnn.extractor.batch_data eşdeğeri (input_overlap=False):
+    log-mel (float16) -> (n_patches, PATCH_FRAMES, N_MELS).
+    """
+    audio, sr = librosa.load(wav_path, sr=MUSICNN_SR)
+    mel = librosa.feature.melspectrogram(
+        y=audio, sr=sr, hop_length=MUSICNN_FFT_HOP, n_fft=MUSICNN_FFT_SIZE, n_mels=MUSICNN_N_MELS
+    ).T
+    mel = mel.astype(np.float16)
+    mel = np.log10(10000 * mel + 1)
+
+    last_frame = mel.shape[0] - PATCH_FRAMES + 1
+    if last_frame <= 0:
+        raise RuntimeError(f"audio too short for musicnn ({mel.shape[0]} frames < {PATCH_FRAMES})")
+
+    starts = range(0, last_frame, PATCH_FRAMES)
+    return np.stack([mel[t:t + PATCH_FRAMES] for t in starts]).astype(np.float16)
+
+
+class MusicnnModel:
+    """
+    TF1-compat graph + session, bir kere kurulur; predict() thread-safe değil,
+    model server'da tek executor thread'inden çağrılır.
+    """
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        import tensorflow as tf
+        import musicnn
+        from musicnn import configuration as config
+        from musicnn import models
+
+        self.model = model
+        labels = config.MSD_LABELS if "MSD" in model else config.MTT_LABELS
+        self.tags: List[str] = [str(t).lower() for t in labels]
+
+        self._graph = tf.Graph()
+        with self._graph.as_default():
+            with tf.name_scope("model"):
+                self._x = tf.compat.v1.placeholder(tf.float32, [None, PATCH_FRAMES, MUSICNN_N_MELS])
+                self._is_training = tf.compat.v1.placeholder(tf.bool)
+                out = models.define_model(self._x, self._is_training, model, len(labels))
+                self._y = tf.nn.sigmoid(out[0])
+
+            self._sess = tf.compat.v1.Session(graph=self._graph)
+            self._sess.run(tf.compat.v1.global_variables_initializer())
+            saver = tf.compat.v1.train.Saver()
+            saver.restore(self._sess, os.path.join(os.path.dirname(musicnn.__file__), model) + "/")
+
+    def predict(self, patches: np.ndarray, max_batch: int = 64) -> np.ndarray:
+        """(n, PATCH_FRAMES, N_MELS) -> (n, n_tags) sigmoid olasılıkları."""
+        outs = []
+        for i in range(0, patches.shape[0], max_batch):
+            chunk = patches[i:i + max_batch].astype(np.float32)
+            outs.append(self._sess.run(self._y, feed_dict={self._x: chunk, self._is_training: False}))
+        return np.concatenate(outs, axis=0).astype(np.float32)
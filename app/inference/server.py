@@ -0,0 +1,249 @@
+# app/inference/server.py
+"""
+Paylaşılan musicnn inference server'ı.
+
+`uvicorn --workers N` ile her worker kendi TF/musicnn kopyasını tutmasın diye
+model tek bir process'te yüklenir. Worker'lar mel patch'lerini Unix socket
+üzerinden gönderir; server istekleri `max_wait_ms` süresince / `max_batch`
+patch dolana kadar biriktirip tek sess.run ile çalıştırır. İstemcinin cevap
+timeout'u (header "timeout_sec") geçmiş istekler batch'e alınmaz: istemci
+zaten vazgeçmiştir, hesaplamak sıradakileri geciktirir.
+
+    python -m app.inference.server --socket /tmp/audio-analyzer/model.sock
+    INFERENCE_SOCKET=/tmp/audio-analyzer/model.sock uvicorn app.main:app --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.core.logging import setup_logging
+from app.inference.client import HEADER_LEN, encode_message
+from app.inference.musicnn_model import DEFAULT_MODEL, MUSICNN_N_MELS, PATCH_FRAMES, MusicnnModel
+
+log = logging.getLogger("model_server")
+
+# batch boyutu histogramı (patch sayısı) için üst sınırlar
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+@dataclass
+class _Job:
+    patches: np.ndarray
+    future: asyncio.Future
+    enqueued_at: float
+    # perf_counter; istemci bu zamandan sonra cevabı beklemiyor
+    deadline: float | None = None
+
+
+class ModelServer:
+    def __init__(self, model: Any, max_batch: int = 64, max_wait_ms: float = 20.0):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: asyncio.Queue[_Job] = asyncio.Queue()
+        # TF session tek thread'den kullanılıyor; event loop inference sırasında bloklanmaz
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="musicnn")
+
+        self.started_at = time.time()
+        self.requests_total = 0
+        self.patches_total = 0
+        self.batches_total = 0
+        self.errors_total = 0
+        self.expired_total = 0
+        self.queued_patches = 0
+        self.inflight_patches = 0
+        self.batch_hist = {b: 0 for b in BATCH_BUCKETS}
+        self.batch_hist_overflow = 0
+        self._wait_ms_sum = 0.0
+        self._infer_ms_sum = 0.0
+
+    # ------------------------------------------------------------------ metrics
+
+    def stats(self) -> Dict[str, Any]:
+        batches = max(self.batches_total, 1)
+        return {
+            "uptime_sec": time.time() - self.started_at,
+            "queue_depth": self.queue.qsize(),
+            "queued_patches": self.queued_patches,
+            "inflight_patches": self.inflight_patches,
+            "requests_total": self.requests_total,
+            "patches_total": self.patches_total,
+            "batches_total": self.batches_total,
+            "errors_total": self.errors_total,
+            "expired_total": self.expired_total,
+            "avg_batch_size": self.patches_total / batches if self.batches_total else 0.0,
+            "avg_queue_wait_ms": self._wait_ms_sum / max(self.requests_total, 1),
+            "avg_infer_ms": self._infer_ms_sum / batches if self.batches_total else 0.0,
+            "batch_size_hist": {f"le_{b}": n for b, n in self.batch_hist.items()} | {"gt_max": self.batch_hist_overflow},
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+        }
+
+    def _observe_batch(self, n: int) -> None:
+        for b in BATCH_BUCKETS:
+            if n <= b:
+                self.batch_hist[b] += 1
+                return
+        self.batch_hist_overflow += 1
+
+    # ------------------------------------------------------------------ batching
+
+    async def predict(self, patches: np.ndarray, timeout_sec: float | None = None) -> np.ndarray:
+        fut = asyncio.get_running_loop().create_future()
+        self.queued_patches += patches.shape[0]
+        now = time.perf_counter()
+        deadline = now + timeout_sec if timeout_sec else None
+        await self.queue.put(_Job(patches, fut, now, deadline))
+        return await fut
+
+    async def batch_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            jobs: List[_Job] = [await self.queue.get()]
+            n = jobs[0].patches.shape[0]
+
+            # deadline'a kadar / max_batch dolana kadar topla
+            deadline = loop.time() + self.max_wait
+            while n < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    job = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                jobs.append(job)
+                n += job.patches.shape[0]
+
+            self.queued_patches -= n
+            now = time.perf_counter()
+            for j in jobs:
+                self._wait_ms_sum += (now - j.enqueued_at) * 1000.0
+
+            # istemcisi timeout'a düşmüş işler hesaplanmaz
+            live = [j for j in jobs if j.deadline is None or now <= j.deadline]
+            for j in jobs:
+                if j not in live:
+                    self.expired_total += 1
+                    if not j.future.done():
+                        j.future.set_exception(TimeoutError("request expired in queue"))
+            if not live:
+                continue
+            jobs = live
+            n = sum(j.patches.shape[0] for j in jobs)
+
+            batch = np.concatenate([j.patches for j in jobs], axis=0)
+            self.inflight_patches = n
+            t0 = time.perf_counter()
+            try:
+                probs = await loop.run_in_executor(self.executor, self.model.predict, batch, self.max_batch)
+            except Exception as e:
+                self.errors_total += 1
+                log.exception("inference failed batch=%s", n)
+                for j in jobs:
+                    if not j.future.done():
+                        j.future.set_exception(e)
+                continue
+            finally:
+                self.inflight_patches = 0
+
+            self._infer_ms_sum += (time.perf_counter() - t0) * 1000.0
+            self.batches_total += 1
+            self.patches_total += n
+            self._observe_batch(n)
+
+            offset = 0
+            for j in jobs:
+                k = j.patches.shape[0]
+                if not j.future.done():
+                    j.future.set_result(probs[offset:offset + k])
+                offset += k
+
+    # ------------------------------------------------------------------ transport
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            (hlen,) = HEADER_LEN.unpack(await reader.readexactly(HEADER_LEN.size))
+            header = json.loads(await reader.readexactly(hlen))
+            (plen,) = HEADER_LEN.unpack(await reader.readexactly(HEADER_LEN.size))
+            payload = await reader.readexactly(plen) if plen else b""
+
+            op = header.get("op")
+            if op == "stats":
+                writer.write(encode_message({"ok": True, "stats": self.stats()}))
+            elif op == "predict":
+                shape = tuple(int(x) for x in header["shape"])
+                if len(shape) != 3 or shape[1:] != (PATCH_FRAMES, MUSICNN_N_MELS) or shape[0] == 0:
+                    raise ValueError(f"invalid patch shape {shape}, expected (n, {PATCH_FRAMES}, {MUSICNN_N_MELS})")
+                patches = np.frombuffer(payload, dtype=header.get("dtype", "float16")).reshape(shape)
+
+                self.requests_total += 1
+                timeout_sec = header.get("timeout_sec")
+                probs = await self.predict(patches, float(timeout_sec) if timeout_sec else None)
+                probs = np.ascontiguousarray(probs, dtype=np.float32)
+                writer.write(encode_message(
+                    {"ok": True, "shape": list(probs.shape), "dtype": "float32", "tags": self.model.tags},
+                    probs.tobytes(),
+                ))
+            else:
+                raise ValueError(f"unknown op {op!r}")
+        except asyncio.IncompleteReadError:
+            return
+        except Exception as e:
+            writer.write(encode_message({"ok": False, "error": f"{type(e).__name__}: {e}"}))
+        finally:
+            try:
+                await writer.drain()
+                writer.close()
+            except Exception:
+                pass
+
+
+async def serve(socket_path: str, model: Any, max_batch: int, max_wait_ms: float) -> None:
+    os.makedirs(os.path.dirname(socket_path) or ".", exist_ok=True)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)  # önceki çalışmadan kalan socket
+
+    server = ModelServer(model, max_batch=max_batch, max_wait_ms=max_wait_ms)
+    batcher = asyncio.create_task(server.batch_loop())
+    srv = await asyncio.start_unix_server(server.handle, path=socket_path)
+    log.info("model server listening socket=%s max_batch=%s max_wait_ms=%s", socket_path, max_batch, max_wait_ms)
+    try:
+        async with srv:
+            await srv.serve_forever()
+    finally:
+        batcher.cancel()
+        server.executor.shutdown(wait=False)
+        try:
+            os.remove(socket_path)
+        except Exception:
+            pass
+
+
+def main() -> None:
+    from app.core.config import settings
+
+    ap = argparse.ArgumentParser(description="Shared musicnn inference server")
+    ap.add_argument("--socket", default=settings.inference_socket or os.path.join(settings.tmp_dir, "model.sock"))
+    ap.add_argument("--model", default=DEFAULT_MODEL)
+    ap.add_argument("--max-batch", type=int, default=64, help="batch başına en fazla patch")
+    ap.add_argument("--max-wait-ms", type=float, default=20.0, help="ilk istekten sonra batch toplama süresi")
+    args = ap.parse_args()
+
+    setup_logging()
+    model = MusicnnModel(args.model)
+    asyncio.run(serve(args.socket, model, args.max_batch, args.max_wait_ms))
+
+
+if __name__ == "__main__":
+    main()
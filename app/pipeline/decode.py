@@ -29,3 +29,26 @@ def decode_to_wav(input_path: str, output_wav_path: str, sample_rate: int = 4410
         raise RuntimeError(f"ffmpeg decode failed: {p.stderr[-1000:]}")
 
     return DecodedAudio(wav_path=output_wav_path, sample_rate=sample_rate)
+
+def probe_duration(input_path: str) -> float | None:
+    """
+    ffprobe ile container süresi (sn). Decode etmeden, bellek planı için.
+    Okunamazsa None.
+    """
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1",
+        input_path,
+    ]
+    try:
+        p = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    except OSError:
+        return None
+    if p.returncode != 0:
+        return None
+    try:
+        return float(p.stdout.strip())
+    except ValueError:
+        return None
@@ -7,32 +7,63 @@ def _clamp(x: float, lo: float = 0.0, hi: float = 1.0) -> float:
 def _safe_log(x: float) -> float:
     return float(np.log(max(x, 1e-12)))
 
-def compute_audio_features(y: np.ndarray, sr: int, bpm: float | None = None, bpm_conf: float | None = None) -> dict:
+FRAME_LENGTH = 2048
+HOP_LENGTH = 512
+
+# compute_frame_stats değişirse artır: feature store'daki eski frame_stats kayıtları geçersiz olur.
+# (audio_features_from_stats içindeki ağırlıklar store'a yazılmaz, versiyon gerektirmez.)
+FRAME_STATS_VERSION = 1
+
+def compute_frame_series(y: np.ndarray, sr: int) -> dict:
+    """
+    Frame-level (hop=512) RMS / centroid / rolloff / flatness / ZCR serileri.
+    compute_frame_stats bunları skalere indirger; frames export aynen kullanır.
+    """
+    rms = librosa.feature.rms(y=y, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)[0]
+    centroid = librosa.feature.spectral_centroid(y=y, sr=sr, hop_length=HOP_LENGTH)[0]
+    rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr, roll_percent=0.85, hop_length=HOP_LENGTH)[0]
+    flatness = librosa.feature.spectral_flatness(y=y, hop_length=HOP_LENGTH)[0]
+    zcr = librosa.feature.zero_crossing_rate(y, frame_length=FRAME_LENGTH, hop_length=HOP_LENGTH)[0]
+
+    return {
+        "rms": rms,
+        "centroid": centroid,
+        "rolloff": rolloff,
+        "flatness": flatness,
+        "zcr": zcr,
+    }
+
+def compute_frame_stats(y: np.ndarray, sr: int) -> dict:
     """
-    Spotify/Sonoteller hissi veren "yaklaşık" features.
-    (Hepsi 0..1 olacak şekilde normalize edilmeye çalışılır.)
-    Not: Bunlar heuristics. Sonra gerekirse ML ile iyileştiririz.
+    Frame serilerinin skaler özetleri (pahalı kısım: STFT tabanlı feature'lar).
     """
+    series = compute_frame_series(y, sr)
+    return {
+        "rms_mean": float(np.mean(series["rms"])),
+        "rms_p95": float(np.percentile(series["rms"], 95)),
+        "centroid_mean": float(np.mean(series["centroid"])),
+        "rolloff_mean": float(np.mean(series["rolloff"])),
+        "flatness_mean": float(np.mean(series["flatness"])),
+        "zcr_mean": float(np.mean(series["zcr"])),
+    }
 
-    # RMS energy
-    rms = librosa.feature.rms(y=y, frame_length=2048, hop_length=512)[0]
-    rms_mean = float(np.mean(rms))
-    rms_p95 = float(np.percentile(rms, 95))
+def audio_features_from_stats(stats: dict, bpm: float | None = None, bpm_conf: float | None = None) -> dict:
+    """
+    compute_frame_stats çıktısından heuristic features ("yaklaşık", 0..1'e normalize).
+    Ucuz; ağırlıklar değişince feature store'daki frame_stats üzerinden yeniden çalıştırılır.
+    """
+    rms_mean = float(stats["rms_mean"])
+    rms_p95 = float(stats["rms_p95"])
 
     # Energy: RMS'i log ölçeğe alıp normalize et
     # tipik rms_mean aralığı kaba olarak 0.01-0.2
     energy = _clamp((_safe_log(rms_mean) - _safe_log(0.01)) / (_safe_log(0.20) - _safe_log(0.01)))
 
     # Spectral features
-    centroid = librosa.feature.spectral_centroid(y=y, sr=sr)[0]
-    rolloff = librosa.feature.spectral_rolloff(y=y, sr=sr, roll_percent=0.85)[0]
-    flatness = librosa.feature.spectral_flatness(y=y)[0]
-    zcr = librosa.feature.zero_crossing_rate(y)[0]
-
-    centroid_mean = float(np.mean(centroid))
-    rolloff_mean = float(np.mean(rolloff))
-    flatness_mean = float(np.mean(flatness))
-    zcr_mean = float(np.mean(zcr))
+    centroid_mean = float(stats["centroid_mean"])
+    rolloff_mean = float(stats["rolloff_mean"])
+    flatness_mean = float(stats["flatness_mean"])
+    zcr_mean = float(stats["zcr_mean"])
 
     # Acousticness (heuristic):
     # - akustik parçalarda centroid/rolloff daha düşük, flatness daha düşük olabiliyor (çok kaba)
@@ -0,0 +1,83 @@
+# app/pipeline/frames.py
+from __future__ import annotations
+
+import io
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.pipeline.features import HOP_LENGTH, compute_frame_series
+from app.pipeline.hpss import compute_hpss_features
+
+# musicnn MSD modeli input_length=3, overlap yok -> her taggram satırı 3 saniye
+TAGGRAM_HOP_SEC = 3.0
+
+FRAME_DTYPES = {"float16": np.float16, "float32": np.float32}
+
+
+def decimate_frames(x: np.ndarray, factor: int) -> np.ndarray:
+    """
+    Son eksende (zaman) `factor` frame'lik bloklar halinde ortalama alır.
+    Stride ile atlamak yerine ortalama: kısa onset peak'leri kaybolmasın.
+    Son eksik blok da kendi ortalamasıyla eklenir.
+    """
+    if factor <= 1:
+        return x
+
+    n = x.shape[-1]
+    n_full = n // factor
+    head = x[..., : n_full * factor].reshape(*x.shape[:-1], n_full, factor).mean(axis=-1)
+    if n_full * factor == n:
+        return head
+    tail = x[..., n_full * factor:].mean(axis=-1, keepdims=True)
+    return np.concatenate([head, tail], axis=-1)
+
+
+def compute_frame_timeseries(y: np.ndarray, sr: int, hpss_mode: str = "exact") -> Dict[str, np.ndarray]:
+    """
+    Pipeline'ın zaten hesapladığı frame-level serileri tek zaman ekseninde toplar
+    (hop=512). Boyları 1-2 frame oynayabildiği için en kısaya kırpılır.
+    """
+    series = compute_frame_series(y, sr)
+    # onset + chroma tek HPSS geçişinden
+    hpss = compute_hpss_features(y, sr, mode=hpss_mode)
+    series["onset_strength"] = hpss["onset_env"]
+    series["chroma"] = hpss["chroma"]
+
+    n = min(v.shape[-1] for v in series.values())
+    return {k: np.asarray(v[..., :n]) for k, v in series.items()}
+
+
+def pack_frames_npz(
+    series: Dict[str, np.ndarray],
+    *,
+    sr: int,
+    decimate: int = 1,
+    dtype: str = "float16",
+    taggram: Tuple[np.ndarray, List[str]] | None = None,
+) -> bytes:
+    """
+    Serileri sıkıştırılmış .npz olarak paketler (JSON/pydantic yolu yok).
+    Kolonlar `dtype` (varsayılan float16) ile yazılır; zaman ekseni
+    frame_hop_sec * decimate ile geri hesaplanabilir, ayrı bir times kolonu yok.
+    """
+    np_dtype = FRAME_DTYPES[dtype]
+
+    arrays: Dict[str, np.ndarray] = {
+        k: decimate_frames(np.asarray(v, dtype=np.float32), decimate).astype(np_dtype)
+        for k, v in series.items()
+    }
+    arrays["sample_rate"] = np.asarray(sr, dtype=np.int32)
+    arrays["frame_hop_sec"] = np.asarray(HOP_LENGTH * decimate / sr, dtype=np.float64)
+    arrays["decimate"] = np.asarray(decimate, dtype=np.int32)
+
+    if taggram is not None:
+        tg, tags = taggram
+        # taggram'ın kendi zaman ekseni var (3 sn patch); decimation uygulanmaz
+        arrays["taggram"] = np.asarray(tg, dtype=np.float32).astype(np_dtype)
+        arrays["taggram_tags"] = np.asarray(tags, dtype=np.str_)
+        arrays["taggram_hop_sec"] = np.asarray(TAGGRAM_HOP_SEC, dtype=np.float64)
+
+    buf = io.BytesIO()
+    np.savez_compressed(buf, **arrays)
+    return buf.getvalue()
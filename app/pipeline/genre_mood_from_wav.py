@@ -1,9 +1,21 @@
 # app/pipeline/genre_mood_from_wav.py
 from __future__ import annotations
 
+import logging
+import threading
 from typing import Dict, Any, List, Tuple
 import numpy as np
 
+from app.core.config import settings
+from app.inference.client import ModelServerError, ModelServerUnavailable, predict_remote
+from app.inference.musicnn_model import compute_patches
+
+log = logging.getLogger("genre_mood")
+
+# musicnn.extractor her çağrıda default graph'ı resetliyor; analiz thread pool'da
+# koştuğu için yerel extractor çağrıları serileştirilir.
+_EXTRACTOR_LOCK = threading.Lock()
+
 
 # musicnn çıktı etiketleri içinde sık geçen genre/mood alt-kümeleri
 GENRE_TAGS = [
@@ -16,6 +28,9 @@ MOOD_TAGS = [
     "happy", "sad", "relax", "aggressive", "party", "dark", "romantic", "epic"
 ]
 
+# extract_taggram / model değişirse artır: feature store'daki eski taggram_avg kayıtları geçersiz olur.
+TAGGRAM_VERSION = 1
+
 
 def _top_and_dist(
     tags: List[str],
@@ -36,40 +51,61 @@ def _top_and_dist(
     return top_label, top_conf, dist
 
 
-def predict_genre_and_mood_from_wav(wav_path: str) -> Dict[str, Any]:
-    warnings: List[str] = []
+def extract_taggram(wav_path: str) -> Tuple[np.ndarray, List[str]]:
+    """
+    musicnn taggram (n_patches, n_tags) + lowercase tag isimleri.
+    Model server ayarlıysa önce ona gider (batch'li, paylaşılan model);
+    server'a bağlanılamıyor / hata döndürdüyse yerel extractor'a düşer; bağlanıp
+    cevap süresinde gelmediyse (ModelServerTimeout, server meşgul) düşmez, yoksa
+    yük altında her worker kendi TF kopyasını yüklerdi.
+    musicnn yoksa ImportError, extractor patlarsa RuntimeError fırlatır.
+    """
+    if settings.inference_socket:
+        try:
+            patches = compute_patches(wav_path)
+            taggram, tags = predict_remote(
+                settings.inference_socket,
+                patches,
+                connect_timeout_sec=settings.inference_connect_timeout_sec,
+                queue_wait_sec=settings.inference_queue_wait_sec,
+                sec_per_patch=settings.inference_sec_per_patch,
+            )
+            return np.asarray(taggram, dtype=np.float64), [t.lower() for t in tags]
+        except (ModelServerUnavailable, ModelServerError) as e:
+            log.warning("model server failed, falling back to local musicnn: %s", e)
+
+    from musicnn.extractor import extractor
+
+    with _EXTRACTOR_LOCK:
+        out = extractor(wav_path, model="MSD_musicnn", input_length=3, input_overlap=False)
 
-    try:
-        from musicnn.extractor import extractor
-    except Exception as e:
-        return {
-            "genre": {"top": "unknown", "confidence": 0.0, "distribution": [{"label": "unknown", "score": 1.0}]},
-            "mood": {"valence": 0.5, "arousal": 0.5, "tags": [{"label": "unknown", "score": 1.0}]},
-            "warnings": [f"musicnn not available: {e}"],
-        }
+    # musicnn sürümüne göre dönüş: (taggram, tags) veya (taggram, tags, features) vb.
+    if isinstance(out, (tuple, list)) and len(out) >= 2:
+        taggram, tags = out[0], out[1]
+    else:
+        raise RuntimeError(f"musicnn extractor returned unexpected value: {type(out)} len={getattr(out, '__len__', None)}")
 
-    try:
-        out = extractor(wav_path, model="MSD_musicnn", input_length=3, input_overlap=False)
+    taggram = np.asarray(taggram, dtype=np.float64)
+    if taggram.ndim != 2 or taggram.shape[0] == 0:
+        raise RuntimeError(f"musicnn taggram invalid shape: {taggram.shape}")
 
-        # musicnn sürümüne göre dönüş: (taggram, tags) veya (taggram, tags, features) vb.
-        if isinstance(out, (tuple, list)) and len(out) >= 2:
-            taggram, tags = out[0], out[1]
-        else:
-            raise RuntimeError(f"musicnn extractor returned unexpected value: {type(out)} len={getattr(out, '__len__', None)}")
-
-        taggram = np.asarray(taggram, dtype=np.float64)
-        if taggram.ndim != 2 or taggram.shape[0] == 0:
-            raise RuntimeError(f"musicnn taggram invalid shape: {taggram.shape}")
-
-        avg = taggram.mean(axis=0)  # (n_tags,)
-        tags = [str(t).lower() for t in tags]
-
-    except Exception as e:
-        return {
-            "genre": {"top": "unknown", "confidence": 0.0, "distribution": [{"label": "unknown", "score": 1.0}]},
-            "mood": {"valence": 0.5, "arousal": 0.5, "tags": [{"label": "unknown", "score": 1.0}]},
-            "warnings": [f"musicnn extractor failed: {e}"],
-        }
+    return taggram, [str(t).lower() for t in tags]
+
+
+def unknown_genre_and_mood(warning: str) -> Dict[str, Any]:
+    return {
+        "genre": {"top": "unknown", "confidence": 0.0, "distribution": [{"label": "unknown", "score": 1.0}]},
+        "mood": {"valence": 0.5, "arousal": 0.5, "tags": [{"label": "unknown", "score": 1.0}]},
+        "warnings": [warning],
+    }
+
+
+def genre_and_mood_from_tag_scores(avg: np.ndarray, tags: List[str]) -> Dict[str, Any]:
+    """
+    Ortalama taggram (n_tags,) -> genre dağılımı + mood/valence/arousal heuristiği.
+    """
+    warnings: List[str] = []
+    tags = [str(t) for t in tags]
 
     tag_to_score = {tags[i]: float(avg[i]) for i in range(min(len(tags), len(avg)))}
 
@@ -0,0 +1,197 @@
+# app/pipeline/hpss.py
+"""
+Spektral domainde, bloklu harmonic/percussive ayrıştırma (tempo + key için).
+
+librosa.effects.hpss tüm parçanın STFT'sini alır, iki median filtre uygular ve
+H/P'yi ISTFT ile zaman domenine döndürür; tempo (onset_strength) ve key
+(chroma_cqt) sonra bunların STFT/CQT'sini yeniden hesaplar. Burada:
+
+  - STFT zaman ekseninde `block_frames`'lik bloklarla alınır; her blok median
+    filtrenin yarı çekirdeği kadar komşu frame (halo) ile hesaplanır, sonuçtan
+    sadece blok içi frame'ler tutulur -> tepe bellek parça süresinden bağımsız.
+  - Soft mask'li H/P magnitude'ları doğrudan tüketilir: P^2 -> mel -> onset
+    envelope, H -> spektral tepeler (piptrack, parabolik interpolasyon) ->
+    chroma. ISTFT ve ikinci STFT/CQT yok. (chroma_stft n_fft=2048'de alt/orta
+    register'da komşu pitch class'lara taşıyor; tepe frekansı bunu önlüyor.)
+  - Tek geçişte hem onset envelope hem chroma çıkar (eskiden HPSS iki kez).
+  - mode="fast": harmonic (zaman ekseni) median, FAST_POOL frame'lik ortalama
+    ile küçültülmüş magnitude üzerinde kısa çekirdekle çalışır ve tekrar
+    genişletilir; percussive (frekans ekseni) median aynı açıklıkta ama her
+    FAST_POOL'uncu bin'i kullanan seyrek footprint ile. Frekansta ortalama
+    alınmaz: harmonik tepelerin komşu bin oranlarını bozup chroma'yı kaydırıyor.
+    Mask'ler tam çözünürlükte uygulanır.
+
+Doğruluk / hız (python -m tools.bench_hpss --tracks 12 --duration 30; sentetik
+referanslar: akor yürüyüşü + bas + kick/hihat, bilinen BPM 70-170 ve tonalite,
+44.1 kHz; eski yol = tempo ve key için ayrı ayrı effects.hpss + onset_strength /
+chroma_cqt; BPM ±%4, "metrik" = x1/2, x2, x1/3, x3 toleranslı):
+
+    yol              s/parça  hız    BPM ±4%  BPM ±4% metrik  key doğru
+    librosa (eski)    4.04    1.0x    6/12       9/12          12/12
+    spectral exact    1.84    2.2x    7/12      10/12          12/12
+    spectral fast     0.49    8.2x    7/12      10/12          12/12
+
+exact mode H/P magnitude'ları librosa.decompose.hpss ile float32 hassasiyetinde
+aynı (blok boyundan bağımsız); fast mode BPM'leri exact ile birebir aynı çıktı.
+BPM farkı ISTFT->STFT tur dönüşünün olmamasından: bir parçada eski yolun 2:3
+metrik hatası (103.4 vs 155.7) düzeldi, diğerlerinde BPM aynı. Sabit C-E-G
+akorunda (tools.loadtest sentetiği) chroma_stft E minor'a kayarken tepe chroma
+eski yol gibi C major buluyor. Tepe bellek ~60 MB + ~1 B/örnek (eski yol ~130 B/örnek).
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+import librosa
+from scipy.ndimage import median_filter
+
+N_FFT = 2048
+HOP_LENGTH = 512
+# librosa.decompose.hpss varsayılanı
+KERNEL_SIZE = 31
+# ~12 s @ 44.1 kHz; blok başına birkaç float32 (1025 x ~1050) tampon, toplam ~60 MB
+BLOCK_FRAMES = 1024
+# fast mod: harmonic median'da kaç frame ortalanır / percussive median'da kaç bin'de bir tap
+FAST_POOL = 3
+# chroma için aranan harmonik tepe aralığı (A1 .. ~B7) ve frame tepesine göre eşik
+CHROMA_FMIN = 55.0
+CHROMA_FMAX = 4000.0
+CHROMA_PEAK_THRESHOLD = 0.05
+
+HPSS_MODES = ("exact", "fast")
+
+
+def _segment(y: np.ndarray, start: int, end: int) -> np.ndarray:
+    """y[start:end], sınır dışı kısımlar sıfır (stft center=True, pad_mode="constant" ile aynı)."""
+    if start >= 0 and end <= len(y):
+        return y[start:end]
+    out = np.zeros(end - start, dtype=y.dtype)
+    lo, hi = max(start, 0), min(end, len(y))
+    if hi > lo:
+        out[lo - start:hi - start] = y[lo:hi]
+    return out
+
+
+def _median(S: np.ndarray, axis: int, kernel: int, pool: int) -> np.ndarray:
+    """
+    `axis` boyunca median filtre. pool > 1 ise yaklaşık:
+      axis=1 (zaman): pool frame'lik ortalamalar üzerinde kernel/pool çekirdek
+      axis=0 (frekans): kernel açıklığında her pool'uncu bin (seyrek footprint)
+    """
+    if pool <= 1:
+        size = (kernel, 1) if axis == 0 else (1, kernel)
+        return median_filter(S, size=size, mode="reflect")
+
+    if axis == 0:
+        taps = np.zeros((kernel, 1), dtype=bool)
+        taps[::pool] = True
+        return median_filter(S, footprint=taps, mode="reflect")
+
+    n = S.shape[1]
+    m = -(-n // pool)
+    if m * pool != n:
+        S = np.pad(S, [(0, 0), (0, m * pool - n)], mode="edge")
+    small = S.reshape(S.shape[0], m, pool).mean(axis=2)
+    k = max(kernel // pool, 1) | 1  # tek sayı
+    small = median_filter(small, size=(1, k), mode="reflect")
+    return np.repeat(small, pool, axis=1)[:, :n]
+
+
+def iter_hpss_blocks(
+    y: np.ndarray,
+    *,
+    mode: str = "exact",
+    n_fft: int = N_FFT,
+    hop_length: int = HOP_LENGTH,
+    kernel_size: int = KERNEL_SIZE,
+    block_frames: int = BLOCK_FRAMES,
+) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Ardışık frame blokları için (H, P) magnitude spektrogramları (1 + n_fft/2, frames).
+    Frame'ler librosa.stft(center=True) ile aynı; bloklar birleştirilince
+    tam parçanın frame sayısı (1 + len(y) // hop) elde edilir.
+    """
+    if mode not in HPSS_MODES:
+        raise ValueError(f"unknown HPSS mode {mode!r}, expected one of {HPSS_MODES}")
+    pool = FAST_POOL if mode == "fast" else 1
+
+    y = np.asarray(y, dtype=np.float32)
+    n_frames = 1 + len(y) // hop_length
+    # harmonic filtre zaman ekseninde: blok kenarında tam pencere için halo;
+    # pool ızgarası bloklar arasında kaymasın diye pool'un katı
+    halo = -(-(kernel_size // 2) // pool) * pool + pool
+    block = max(block_frames // pool, 1) * pool
+
+    for a in range(0, n_frames, block):
+        b = min(a + block, n_frames)
+        fa, fb = max(a - halo, 0), min(b + halo, n_frames)
+
+        seg = _segment(y, fa * hop_length - n_fft // 2, (fb - 1) * hop_length + n_fft - n_fft // 2)
+        S = np.abs(librosa.stft(seg, n_fft=n_fft, hop_length=hop_length, center=False))
+
+        harm = _median(S, axis=1, kernel=kernel_size, pool=pool)
+        perc = _median(S, axis=0, kernel=kernel_size, pool=pool)
+
+        # soft mask (power=2, margin=1), librosa.util.softmask ile aynı
+        harm **= 2
+        perc **= 2
+        total = harm + perc
+        np.maximum(total, np.finfo(np.float32).tiny, out=total)
+
+        inner = slice(a - fa, b - fa)
+        S = S[:, inner]
+        yield S * (harm[:, inner] / total[:, inner]), S * (perc[:, inner] / total[:, inner])
+
+
+def _peak_chroma(H: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Harmonic magnitude -> (12, frames) chroma, frame başına max=1 (chroma_cqt gibi).
+    Tepe frekansları blok içinden tahmin edilen tuning ile pitch class'a yuvarlanır.
+    """
+    pitches, mags = librosa.piptrack(
+        S=H, sr=sr, n_fft=N_FFT, fmin=CHROMA_FMIN, fmax=CHROMA_FMAX, threshold=CHROMA_PEAK_THRESHOLD,
+    )
+    f_idx, t_idx = np.nonzero(pitches > 0)
+    chroma = np.zeros((12, H.shape[1]), dtype=np.float32)
+    if f_idx.size == 0:
+        return chroma
+
+    f, m = pitches[f_idx, t_idx], mags[f_idx, t_idx]
+    # librosa.estimate_tuning ile aynı: medyan üstü tepelerden
+    tuning = librosa.pitch_tuning(f[m >= np.median(m)])
+    pc = np.round(12 * np.log2(f / librosa.note_to_hz("C0")) - tuning).astype(int) % 12
+    np.add.at(chroma, (pc, t_idx), m)
+    return librosa.util.normalize(chroma, norm=np.inf, axis=0)
+
+
+def compute_hpss_features(
+    y: np.ndarray,
+    sr: int,
+    mode: str = "exact",
+    onset: bool = True,
+    chroma: bool = True,
+) -> Dict[str, np.ndarray]:
+    """
+    Tek HPSS geçişinden:
+      onset_env: percussive mel (128) -> dB -> onset_strength, (n_frames,)
+      chroma:    harmonic tepeler -> pitch class, (12, n_frames)
+    """
+    mel_fb = librosa.filters.mel(sr=sr, n_fft=N_FFT) if onset else None
+    mel_blocks: list[np.ndarray] = []
+    chroma_blocks: list[np.ndarray] = []
+
+    for H, P in iter_hpss_blocks(y, mode=mode):
+        if onset:
+            mel_blocks.append(mel_fb @ (P ** 2))
+        if chroma:
+            chroma_blocks.append(_peak_chroma(H, sr))
+
+    out: Dict[str, np.ndarray] = {}
+    if onset:
+        # onset_strength(y=...) ile aynı: power_to_db tüm parçanın tepesine göre
+        mel_db = librosa.power_to_db(np.concatenate(mel_blocks, axis=1))
+        out["onset_env"] = librosa.onset.onset_strength(S=mel_db, sr=sr, hop_length=HOP_LENGTH)
+    if chroma:
+        out["chroma"] = np.concatenate(chroma_blocks, axis=1)
+    return out
@@ -1,11 +1,15 @@
 import numpy as np
-import librosa
 
 # Krumhansl-Schmuckler key profiles
 KRUMHANSL_MAJOR = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88], dtype=float)
 KRUMHANSL_MINOR = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17], dtype=float)
 KEY_NAMES = ["C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B"]
 
+# Chroma hesabı (app.pipeline.hpss.compute_hpss_features) değişirse artır:
+# feature store'daki eski chroma_mean kayıtları geçersiz olur.
+# 2: spektral domain HPSS, harmonic spektral tepelerden chroma (chroma_cqt yerine)
+CHROMA_VERSION = 2
+
 def _z(x: np.ndarray) -> np.ndarray:
     x = np.asarray(x, dtype=float)
     s = np.std(x) + 1e-9
@@ -14,24 +18,12 @@ def _z(x: np.ndarray) -> np.ndarray:
 def _clamp(x: float, lo: float = 0.0, hi: float = 1.0) -> float:
     return float(max(lo, min(hi, x)))
 
-def estimate_key_and_confidence(y: np.ndarray, sr: int) -> tuple[str, str, float]:
+def key_from_chroma_mean(chroma_mean: np.ndarray) -> tuple[str, str, float]:
     """
+    Ortalama chroma (12,) -> Krumhansl-Schmuckler eşleşmesi.
     Returns (key_name, scale, confidence).
-    scale: "major" | "minor" | "unknown"
-    confidence in [0,1] from correlation separation.
     """
-    if y is None or len(y) < sr * 6:  # çok kısa parçada key sallanır
-        return "unknown", "unknown", 0.0
-
-    # Harmonik bileşenle çalışmak genelde daha stabil
-    try:
-        y_harm, _ = librosa.effects.hpss(y)
-    except Exception:
-        y_harm = y
-
-    # Chroma (CQT genelde tonalite için iyi)
-    chroma = librosa.feature.chroma_cqt(y=y_harm, sr=sr)
-    chroma_mean = np.mean(chroma, axis=1)
+    chroma_mean = np.asarray(chroma_mean, dtype=float)
 
     # sessiz/boş parça kontrolü
     if not np.isfinite(chroma_mean).all() or np.sum(chroma_mean) < 1e-6:
@@ -5,6 +5,9 @@ from typing import Tuple
 import numpy as np
 import soundfile as sf
 
+# compute_lufs değişirse artır: feature store'daki eski lufs kayıtları geçersiz olur.
+LUFS_VERSION = 1
+
 def compute_lufs(wav_path: str) -> Tuple[float | None, list[str]]:
     """
     Integrated LUFS (EBU R128 style) hesaplar.
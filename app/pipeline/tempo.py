@@ -1,29 +1,19 @@
 import numpy as np
 import librosa
 
+# Onset envelope hesabı (app.pipeline.hpss.compute_hpss_features) değişirse artır:
+# feature store'daki eski onset_env kayıtları geçersiz olur.
+# 2: spektral domain HPSS (app.pipeline.hpss), ISTFT yok
+ONSET_ENV_VERSION = 2
+
 def _clamp(x: float, lo: float = 0.0, hi: float = 1.0) -> float:
     return float(max(lo, min(hi, x)))
 
-def estimate_bpm_and_confidence(y: np.ndarray, sr: int) -> tuple[float, float]:
+def bpm_from_onset_envelope(onset_env: np.ndarray, sr: int) -> tuple[float, float]:
     """
-    Robust-ish tempo estimation:
-    - HPSS -> percussive component
-    - onset strength -> tempo estimation
-    - confidence -> tempogram peak sharpness + top1-top2 separation
-    Returns: (bpm, confidence in [0,1])
+    Onset envelope (compute_hpss_features) -> (bpm, confidence). HPSS yok, ucuz
+    kısım; feature store'dan gelen envelope ile tekrar çalıştırılabilir.
     """
-    if y is None or len(y) < sr * 3:  # <3s ise tempo çok güvensiz olur
-        return 0.0, 0.0
-
-    # 1) Percussive ağırlıklı çalış
-    try:
-        _, y_perc = librosa.effects.hpss(y)
-    except Exception:
-        y_perc = y
-
-    # 2) Onset envelope
-    onset_env = librosa.onset.onset_strength(y=y_perc, sr=sr)
-
     if onset_env is None or len(onset_env) < 16:
         return 0.0, 0.0
 
@@ -1,23 +1,156 @@
+import hashlib
 import os
 import time
 import uuid
 import logging
+from typing import AsyncIterator, Iterator
 from fastapi import UploadFile
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
 from app.core.config import settings
-from app.pipeline.decode import decode_to_wav
+from app.pipeline.decode import decode_to_wav, probe_duration
 import librosa
+import numpy as np
+import soundfile as sf
 
-from app.pipeline.tempo import estimate_bpm_and_confidence
-from app.pipeline.key import estimate_key_and_confidence
-from app.pipeline.features import compute_audio_features
-from app.pipeline.genre_mood_from_wav import predict_genre_and_mood_from_wav
+from app.pipeline.tempo import ONSET_ENV_VERSION, bpm_from_onset_envelope
+from app.pipeline.key import CHROMA_VERSION, key_from_chroma_mean
+from app.pipeline.hpss import HPSS_MODES, compute_hpss_features
+from app.pipeline.features import FRAME_STATS_VERSION, compute_frame_stats, audio_features_from_stats
+from app.pipeline.genre_mood_from_wav import (
+    TAGGRAM_VERSION,
+    extract_taggram,
+    genre_and_mood_from_tag_scores,
+    unknown_genre_and_mood,
+)
+from app.pipeline.gate import GATE_VERSION, SKIP_STAGES, analyze_content_gate
 from app.pipeline.summary import build_ai_summary
-from app.pipeline.loudness import compute_lufs
+from app.pipeline.loudness import LUFS_VERSION, compute_lufs
+from app.pipeline.frames import compute_frame_timeseries, pack_frames_npz
+from app.services.feature_store import AudioUnavailable, StageRunner, get_feature_store
+from app.services.memory_budget import MB, AdmissionTimeout, AnalysisPlan, memory_budget
 
 log = logging.getLogger("analyzer")
 
+# track stage'i (süre) versiyonu; decode/resample zinciri değişirse artır
+TRACK_VERSION = 1
+
+
+def _trimmed_wav_path(wav_path: str) -> str:
+    return os.path.splitext(wav_path)[0] + ".trim.wav"
+
+
+def _hpss_mode(preset: str) -> str:
+    return "fast" if preset == "fast" else settings.hpss_mode
+
+
+def _stored_hpss_mode(records: list[tuple[str, str, int]], sr: int, preferred: str) -> str:
+    """
+    Replay: parçanın güncel onset_env/chroma_mean kayıtlarının HPSS modu.
+    İkisi de varsa (veya hiç yoksa) preferred; tek mod varsa o.
+    """
+    current = {"onset_env": str(ONSET_ENV_VERSION), "chroma_mean": str(CHROMA_VERSION)}
+    modes = set()
+    for stage, version, rec_sr in records:
+        if rec_sr != sr or stage not in current:
+            continue
+        base, _, mode = version.partition("+")[0].rpartition("-")
+        if base == current[stage] and mode in HPSS_MODES:
+            modes.add(mode)
+    if preferred in modes or not modes:
+        return preferred
+    return sorted(modes)[0]
+
 
 class AnalyzerService:
+    async def _save_upload(self, upload: UploadFile) -> tuple[str, str, str]:
+        """
+        Upload'ı diske yazar.
+        Returns (job_id, in_path, audio_hash) — hash upload byte'larının sha256'sı.
+        """
+        return self._write_upload(await upload.read(), upload.filename)
+
+    @staticmethod
+    def _write_upload(data: bytes, filename: str) -> tuple[str, str, str]:
+        os.makedirs(settings.tmp_dir, exist_ok=True)
+        job_id = uuid.uuid4().hex
+        in_path = os.path.join(settings.tmp_dir, f"{job_id}_{filename}")
+        with open(in_path, "wb") as f:
+            f.write(data)
+        return job_id, in_path, hashlib.sha256(data).hexdigest()
+
+    def _memory_plan(self, in_path: str) -> AnalysisPlan:
+        """
+        Decode'dan önce ffprobe süresinden tepe bellek tahmini + sample rate planı.
+        """
+        duration = probe_duration(in_path)
+        if duration is None:
+            duration = settings.memory_unknown_duration_sec
+            plan = memory_budget.plan(duration, settings.target_sr)
+            plan.duration_probed = False
+            plan.warnings.insert(0, f"memory budget: duration probe failed, assuming {duration:.0f}s")
+            return plan
+        return memory_budget.plan(duration, settings.target_sr)
+
+    @staticmethod
+    def _cleanup(*paths: str) -> None:
+        for p in paths:
+            try:
+                os.remove(p)
+            except Exception:
+                pass
+
+    async def analyze_frames(
+        self,
+        upload: UploadFile,
+        decimate: int,
+        dtype: str,
+        include_taggram: bool,
+    ) -> bytes:
+        """
+        Frame-level serileri (.npz bytes) döner; skalere indirgeme yok.
+        """
+        t0 = time.perf_counter()
+        job_id, in_path, _ = await self._save_upload(upload)
+        wav_path = os.path.join(settings.tmp_dir, f"{job_id}.wav")
+        try:
+            plan = await run_in_threadpool(self._memory_plan, in_path)
+            async with memory_budget.reserve(plan) as admission:
+                payload = await run_in_threadpool(
+                    self._frames_payload, job_id, in_path, wav_path, plan.sample_rate, decimate, dtype, include_taggram,
+                )
+                admission.measured = True
+        finally:
+            self._cleanup(in_path, wav_path)
+
+        log.info(
+            "frames complete job=%s ms=%s bytes=%s",
+            job_id, int((time.perf_counter() - t0) * 1000), len(payload),
+        )
+        return payload
+
+    def _frames_payload(
+        self,
+        job_id: str,
+        in_path: str,
+        wav_path: str,
+        sample_rate: int,
+        decimate: int,
+        dtype: str,
+        include_taggram: bool,
+    ) -> bytes:
+        decoded = decode_to_wav(in_path, wav_path, sample_rate=sample_rate)
+        y, sr = librosa.load(decoded.wav_path, sr=decoded.sample_rate, mono=True)
+        series = compute_frame_timeseries(y, sr, hpss_mode=settings.hpss_mode)
+
+        taggram = None
+        if include_taggram:
+            try:
+                taggram = extract_taggram(decoded.wav_path)
+            except Exception as e:
+                log.warning("frames: taggram skipped job=%s err=%s", job_id, e)
+
+        return pack_frames_npz(series, sr=sr, decimate=decimate, dtype=dtype, taggram=taggram)
+
     async def analyze_upload(
         self,
         upload: UploadFile,
@@ -25,36 +158,299 @@ class AnalyzerService:
         include_instruments: bool,
         include_segments: bool,
     ) -> dict:
+        events = await self.analyze_upload_events(
+            upload=upload,
+            preset=preset,
+            include_instruments=include_instruments,
+            include_segments=include_segments,
+            raise_errors=True,
+        )
+        result: dict = {}
+        async for name, payload in events:
+            if name == "result":
+                result = payload
+        return result
+
+    async def analyze_upload_events(
+        self,
+        upload: UploadFile,
+        preset: str,
+        include_instruments: bool,
+        include_segments: bool,
+        raise_errors: bool = False,
+    ) -> AsyncIterator[tuple[str, dict]]:
+        """
+        Upload byte'larını hemen okur (response stream'i başlamadan UploadFile
+        kapanabilir), sonra her stage bittikçe (event, payload) üreten bir
+        async iterator döner. İlk event "track" (ffprobe süresi, decode'dan önce),
+        bütçe doluysa "queued"; son event "result": tam analiz sonucu.
+        Diske yazma iterator'ın içinde: client stream başlamadan koparsa
+        iterator hiç çalışmaz ve tmp_dir'de dosya kalmaz.
+        raise_errors=False iken hatalar "error" event'i olarak gelir.
+        """
         t0 = time.perf_counter()
 
-        os.makedirs(settings.tmp_dir, exist_ok=True)
-        job_id = uuid.uuid4().hex
+        data = await upload.read()
+        return self._stream_stages(
+            data, upload.filename, preset, include_instruments, include_segments, t0, raise_errors,
+        )
 
-        # 1) Save upload
-        in_path = os.path.join(settings.tmp_dir, f"{job_id}_{upload.filename}")
-        with open(in_path, "wb") as f:
-            f.write(await upload.read())
+    async def _stream_stages(
+        self,
+        data: bytes,
+        filename: str,
+        preset: str,
+        include_instruments: bool,
+        include_segments: bool,
+        t0: float,
+        raise_errors: bool,
+    ) -> AsyncIterator[tuple[str, dict]]:
+        job_id, in_path, wav_path = "-", None, None
+        runner: StageRunner | None = None
+        try:
+            # 1) Save upload (+ audio hash, feature store anahtarı)
+            job_id, in_path, audio_hash = self._write_upload(data, filename)
+            del data  # upload byte'ları stream boyunca tutulmasın
+            wav_path = os.path.join(settings.tmp_dir, f"{job_id}.wav")
 
-        # 2) Decode to wav (mono)
-        wav_path = os.path.join(settings.tmp_dir, f"{job_id}.wav")
-        decoded = decode_to_wav(in_path, wav_path, sample_rate=settings.target_sr)
+            # 2) Bellek planı: bütçeye sığmayacaksa sample rate düşer, yer yoksa kuyrukta bekler
+            # (ffprobe subprocess'i event loop'u bloklamasın)
+            plan = await run_in_threadpool(self._memory_plan, in_path)
 
-        # 3) Load audio
-        y, sr = librosa.load(decoded.wav_path, sr=decoded.sample_rate, mono=True)
-        duration = float(librosa.get_duration(y=y, sr=sr))
+            # 3) Decode + load: sadece store'da eksik/eski bir stage varsa
+            def load_audio() -> tuple[np.ndarray, str]:
+                decoded = decode_to_wav(in_path, wav_path, sample_rate=plan.sample_rate)
+                y, _ = librosa.load(decoded.wav_path, sr=decoded.sample_rate, mono=True)
+                return y, decoded.wav_path
+
+            # ilk event decode/admission beklemeden: ffprobe süresi (probe yoksa None);
+            # decode edilmiş gerçek süre "result"ta
+            yield "track", {
+                "duration_sec": plan.duration_sec if plan.duration_probed else None,
+                "sample_rate": plan.sample_rate,
+            }
+            if memory_budget.would_queue(plan):
+                yield "queued", {
+                    "estimated_mb": plan.estimated_bytes / MB,
+                    "reserved_mb": memory_budget.reserved / MB,
+                    "budget_mb": memory_budget.total / MB,
+                    "waiting": memory_budget.waiting,
+                }
+
+            runner = StageRunner(get_feature_store(), audio_hash, plan.sample_rate, load_audio)
+            async with memory_budget.reserve(plan) as admission:
+                # her stage thread pool'da; event loop diğer istekler için serbest kalır
+                stages = self._iter_stages(runner, preset, include_instruments, include_segments, t0)
+                async for name, payload in iterate_in_threadpool(stages):
+                    if name == "result":
+                        payload["meta"]["warnings"][:0] = plan.warnings
+                        # kalibrasyon sadece soğuk çalışmadan: decode edildi, hiçbir stage store'dan gelmedi
+                        admission.measured = runner.audio_loaded and not runner.hits
+                        log.info(
+                            "analyze complete job=%s ms=%s store_hits=%s",
+                            job_id, payload["meta"]["processing_ms"], ",".join(runner.hits) or "-",
+                        )
+                    yield name, payload
+        except Exception as e:
+            if raise_errors:
+                raise
+            log.exception("analyze stream failed job=%s", job_id)
+            status = 503 if isinstance(e, AdmissionTimeout) else 500
+            yield "error", {"status": status, "detail": str(e)}
+        finally:
+            # cleanup
+            if in_path is not None:
+                self._cleanup(in_path)
+            if wav_path is not None:
+                self._cleanup(wav_path, _trimmed_wav_path(wav_path))
+
+    def reanalyze(
+        self,
+        audio_hash: str,
+        preset: str = "full",
+        include_instruments: bool = False,
+        include_segments: bool = False,
+        hpss_mode: str | None = None,
+    ) -> dict:
+        """
+        Sadece feature store'dan yeniden analiz (heuristic değişikliklerini katalogda
+        replay etmek için). Versiyonu değişmiş bir stage audio isterse AudioUnavailable.
+        Bellek bütçesi yüzünden düşük sample rate'te analiz edilmiş parçalar o
+        sample rate'in kayıtlarıyla replay edilir. hpss_mode verilmezse parçanın
+        kayıtlı olduğu mod kullanılır (preset=fast ile yüklenmiş parçalar "fast").
+        """
+        t0 = time.perf_counter()
+        store = get_feature_store()
+        if store is None:
+            raise RuntimeError("feature store is not configured (feature_store_dir)")
+
+        def load_audio() -> tuple[np.ndarray, str]:
+            raise AudioUnavailable(f"audio {audio_hash} not available for replay; a stored stage is stale")
 
-        # 4) Core analysis
-        bpm, bpm_conf = estimate_bpm_and_confidence(y=y, sr=sr)
-        key_name, key_scale, key_conf = estimate_key_and_confidence(y=y, sr=sr)
-        features = compute_audio_features(y=y, sr=sr, bpm=bpm, bpm_conf=bpm_conf)
+        records = store.records(audio_hash)
+        track_srs = {sr for stage, _, sr in records if stage == "track"}
+        sr = settings.target_sr if settings.target_sr in track_srs or not track_srs else max(track_srs)
+        if hpss_mode is None:
+            hpss_mode = _stored_hpss_mode(records, sr, _hpss_mode(preset))
+        runner = StageRunner(store, audio_hash, sr, load_audio)
+        result: dict = {}
+        stages = self._iter_stages(runner, preset, include_instruments, include_segments, t0, hpss_mode=hpss_mode)
+        for name, payload in stages:
+            if name == "result":
+                result = payload
+        return result
 
-        # 5) Genre + mood (ML if available)
+    def _iter_stages(
+        self,
+        runner: StageRunner,
+        preset: str,
+        include_instruments: bool,
+        include_segments: bool,
+        t0: float,
+        hpss_mode: str | None = None,
+    ) -> Iterator[tuple[str, dict]]:
+        """
+        Stage'leri ilk faydalı sonuca en kısa sürede ulaşacak sırada çalıştırır
+        ve her biri bitince (event, payload) üretir:
+        loudness -> tempo -> key -> audio_features -> genre_mood -> ai_summary -> result
+        Content gate'in atladığı stage'ler de event üretir (varsayılan/unknown değerlerle).
+        hpss_mode verilmezse preset'ten (_hpss_mode).
+        """
+        sr = runner.sr
         warnings_list: list[str] = []
-        gm = predict_genre_and_mood_from_wav(decoded.wav_path)
+
+        # "track" event'i _stream_stages'te ffprobe süresinden gider; decode edilmiş süre result'ta
+        track = runner.run("track", TRACK_VERSION, lambda: {"duration_sec": len(runner.audio()[0]) / sr})
+        duration = float(track["duration_sec"])
+
+        # Content gate: kenar sessizliği kırpılır; silence/noise/speech ise
+        # anlamlı sonuç veremeyecek pahalı stage'ler (HPSS, chroma, musicnn) atlanır
+        gate = runner.run("content_gate", GATE_VERSION, lambda: analyze_content_gate(runner.audio()[0], sr))
+        content = str(gate["content"])
+        trim_start, trim_end = int(gate["trim_start"]), int(gate["trim_end"])
+        skip = SKIP_STAGES[content]
+        analyzed_sec = (trim_end - trim_start) / sr
+
+        if skip:
+            warnings_list.append(f"content gate: {content} detected ({gate['reason']}); skipped {', '.join(skip)}")
+        lead, trail = trim_start / sr, max(duration - trim_end / sr, 0.0)
+        if content != "silence" and lead + trail >= 0.5:
+            warnings_list.append(f"content gate: trimmed {lead:.1f}s leading / {trail:.1f}s trailing silence")
+
+        def audio_trimmed() -> np.ndarray:
+            return runner.audio()[0][trim_start:trim_end]
+
+        # tempo ve key aynı HPSS geçişini paylaşır; biri store'dan gelse de geçiş
+        # ikisini birden üretir (mel/chroma toplamı median filtreler yanında ucuz)
+        hpss_mode = hpss_mode or _hpss_mode(preset)
+        hpss_out: dict = {}
+
+        def hpss_features() -> dict:
+            if not hpss_out:
+                hpss_out.update(compute_hpss_features(audio_trimmed(), sr, mode=hpss_mode))
+            return hpss_out
+
+        def wav_trimmed() -> str:
+            y, wav_path = runner.audio()
+            if trim_start == 0 and trim_end >= len(y):
+                return wav_path
+            trim_path = _trimmed_wav_path(wav_path)
+            if not os.path.exists(trim_path):
+                sf.write(trim_path, y[trim_start:trim_end], sr, subtype="PCM_16")
+            return trim_path
+
+        # LUFS ucuz (HPSS yok): tempo/key'den önce gelsin
+        # (başarısızsa store'a yazılmaz, bir sonraki sefer tekrar denenir)
+        lufs_warnings: list[str] = []
+
+        def lufs_stage() -> dict | None:
+            value, w = compute_lufs(runner.audio()[1])
+            lufs_warnings.extend(w)
+            return None if value is None else {"lufs": value}
+
+        lufs_out = None
+        if "loudness" not in skip:
+            try:
+                lufs_out = runner.run("lufs", LUFS_VERSION, lufs_stage)
+            except AudioUnavailable as e:
+                lufs_warnings.append(f"LUFS skipped: {e}")
+        lufs = float(lufs_out["lufs"]) if lufs_out is not None else None
+        warnings_list.extend(lufs_warnings)
+        yield "loudness", {"loudness_lufs": lufs}
+
+        # 4) Core analysis: pahalı ara çıktılar store'dan, heuristics her seferinde
+        if "tempo" in skip or analyzed_sec < 3.0:  # <3s ise tempo çok güvensiz olur
+            bpm, bpm_conf = 0.0, 0.0
+        else:
+            onset = runner.run(
+                "onset_env", f"{ONSET_ENV_VERSION}-{hpss_mode}",
+                lambda: {"onset_env": hpss_features()["onset_env"]},
+                deps=("content_gate",),
+            )
+            bpm, bpm_conf = bpm_from_onset_envelope(onset["onset_env"], sr)
+        tempo = {"bpm": float(bpm), "confidence": float(bpm_conf)}
+        yield "tempo", tempo
+
+        if "key" in skip or analyzed_sec < 6.0:  # çok kısa parçada key sallanır
+            key_name, key_scale, key_conf = "unknown", "unknown", 0.0
+        else:
+            chroma = runner.run(
+                "chroma_mean", f"{CHROMA_VERSION}-{hpss_mode}",
+                lambda: {"chroma_mean": np.mean(hpss_features()["chroma"], axis=1)},
+                deps=("content_gate",),
+            )
+            key_name, key_scale, key_conf = key_from_chroma_mean(chroma["chroma_mean"])
+        key = {"key": key_name, "scale": key_scale, "confidence": float(key_conf)}
+        yield "key", key
+
+        if "audio_features" in skip:
+            features: dict = {}
+        else:
+            stats = runner.run(
+                "frame_stats", FRAME_STATS_VERSION,
+                lambda: compute_frame_stats(audio_trimmed(), sr),
+                deps=("content_gate",),
+            )
+            features = audio_features_from_stats(stats, bpm=bpm, bpm_conf=bpm_conf)
+        audio_features = {
+            "loudness_lufs": lufs,
+            "loudness_proxy_db": features.get("loudness_proxy_db"),
+            "loudness_norm": features.get("loudness_norm"),
+            "energy": features.get("energy"),
+            "danceability": features.get("danceability"),
+            "acousticness": features.get("acousticness"),
+            "speechiness": features.get("speechiness"),
+            "spectral_centroid_hz": features.get("spectral_centroid_hz"),
+            "spectral_rolloff_hz": features.get("spectral_rolloff_hz"),
+            "spectral_flatness": features.get("spectral_flatness"),
+            "zcr": features.get("zcr"),
+        }
+        yield "audio_features", audio_features
+
+        # 5) Genre + mood (ML if available) — en yavaş stage, sona yakın
+        def taggram_stage() -> dict:
+            taggram, tags = extract_taggram(wav_trimmed())
+            return {"avg": taggram.mean(axis=0), "tags": np.asarray(tags, dtype=np.str_)}
+
+        try:
+            if "genre_mood" in skip:
+                gm = unknown_genre_and_mood(f"genre/mood skipped: {content}")
+                gm["warnings"] = []  # sebep content gate warning'inde
+            else:
+                tg = runner.run("taggram_avg", TAGGRAM_VERSION, taggram_stage, deps=("content_gate",))
+                gm = genre_and_mood_from_tag_scores(tg["avg"], list(tg["tags"]))
+        except AudioUnavailable as e:
+            # replay: genre/mood opsiyonel stage, stale ise unknown + warning
+            gm = unknown_genre_and_mood(f"genre/mood skipped: {e}")
+        except ImportError as e:
+            gm = unknown_genre_and_mood(f"musicnn not available: {e}")
+        except Exception as e:
+            gm = unknown_genre_and_mood(f"musicnn extractor failed: {e}")
         warnings_list.extend(gm.get("warnings", []))
+        yield "genre_mood", {"genre": gm["genre"], "mood": gm["mood"]}
 
         # 6) Build result
-        ai=summary = build_ai_summary(
+        summary = build_ai_summary(
             bpm=float(bpm),
             bpm_conf=float(bpm_conf),
             key_name=key_name,
@@ -63,15 +459,12 @@ class AnalyzerService:
             mood=gm["mood"],
             audio_features=features,
         )
-        # 7) Compute LUFS
-
-        lufs, lufs_warnings = compute_lufs(decoded.wav_path)
-        warnings_list.extend(lufs_warnings)
+        yield "ai_summary", summary
 
-        result = {
+        yield "result", {
             "track": {"duration_sec": duration, "sample_rate": sr},
-            "tempo": {"bpm": float(bpm), "confidence": float(bpm_conf)},
-            "key": {"key": key_name, "scale": key_scale, "confidence": float(key_conf)},
+            "tempo": tempo,
+            "key": key,
 
             # IMPORTANT: gm kullan
             "genre": gm["genre"],
@@ -82,19 +475,7 @@ class AnalyzerService:
                 "distribution": [{"label": "unknown", "score": 1.0}],
             },
 
-            "audio_features": {
-                "loudness_lufs": lufs,
-                "loudness_proxy_db": features.get("loudness_proxy_db"),
-                "loudness_norm": features.get("loudness_norm"),
-                "energy": features.get("energy"),
-                "danceability": features.get("danceability"),
-                "acousticness": features.get("acousticness"),
-                "speechiness": features.get("speechiness"),
-                "spectral_centroid_hz": features.get("spectral_centroid_hz"),
-                "spectral_rolloff_hz": features.get("spectral_rolloff_hz"),
-                "spectral_flatness": features.get("spectral_flatness"),
-                "zcr": features.get("zcr"),
-            },
+            "audio_features": audio_features,
 
             "segments": None if not include_segments else {"beats_count": None, "sections": None},
 
@@ -104,13 +485,3 @@ class AnalyzerService:
             },
             "ai_summary": summary,
         }
-
-        # cleanup
-        for p in (in_path, decoded.wav_path):
-            try:
-                os.remove(p)
-            except Exception:
-                pass
-
-        log.info("analyze complete job=%s ms=%s", job_id, result["meta"]["processing_ms"])
-        return result
@@ -0,0 +1,163 @@
+# app/services/feature_store.py
+from __future__ import annotations
+
+import logging
+import os
+import uuid
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+log = logging.getLogger("feature_store")
+
+Arrays = Dict[str, np.ndarray]
+
+
+class FeatureStore:
+    """
+    Stage ara çıktıları için yerel disk store'u.
+
+    Layout: <root>/<hash[:2]>/<hash>/<stage>@v<version>-sr<sr>.npz
+    Stage kodu değişince modüldeki *_VERSION artırılır; eski dosyalar
+    okunmaz (miss), yeni versiyon yanına yazılır. Bağımlı stage'lerin
+    versiyonu upstream versiyonlarını da içerir (örn. "1+content_gate1").
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _dir(self, audio_hash: str) -> str:
+        return os.path.join(self.root, audio_hash[:2], audio_hash)
+
+    def _path(self, audio_hash: str, stage: str, version: int | str, sr: int) -> str:
+        return os.path.join(self._dir(audio_hash), f"{stage}@v{version}-sr{sr}.npz")
+
+    def get(self, audio_hash: str, stage: str, version: int | str, sr: int) -> Optional[Arrays]:
+        path = self._path(audio_hash, stage, version, sr)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as z:
+                return {k: z[k] for k in z.files}
+        except Exception as e:
+            log.warning("feature store: unreadable %s (%s), recomputing", path, e)
+            return None
+
+    def put(self, audio_hash: str, stage: str, version: int | str, sr: int, arrays: Arrays) -> None:
+        path = self._path(audio_hash, stage, version, sr)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # aynı hash'e paralel yazan worker'lar yarım dosya görmesin: tmp + atomic rename
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+
+    def records(self, audio_hash: str) -> List[Tuple[str, str, int]]:
+        """Parçanın kayıtlı (stage, version_key, sr) üçlüleri."""
+        d = self._dir(audio_hash)
+        if not os.path.isdir(d):
+            return []
+        out: List[Tuple[str, str, int]] = []
+        for name in os.listdir(d):
+            if not name.endswith(".npz"):
+                continue
+            stage, sep, rest = name[:-4].partition("@v")
+            version, sep2, sr = rest.rpartition("-sr")
+            if sep and sep2 and sr.isdigit():
+                out.append((stage, version, int(sr)))
+        return out
+
+    def hashes(self) -> Iterator[str]:
+        if not os.path.isdir(self.root):
+            return
+        for prefix in sorted(os.listdir(self.root)):
+            pdir = os.path.join(self.root, prefix)
+            if not os.path.isdir(pdir):
+                continue
+            for h in sorted(os.listdir(pdir)):
+                yield h
+
+
+class AudioUnavailable(LookupError):
+    """Replay sırasında stale bir stage audio'ya ihtiyaç duydu ama audio yok."""
+
+
+class StageRunner:
+    """
+    Pahalı stage'leri store üzerinden çalıştırır: (stage, version, sr) kaydı varsa
+    okunur, yoksa hesaplanıp yazılır. Audio (decode + load) sadece bir stage
+    miss olursa yüklenir; replay'de tüm stage'ler güncelse hiç decode yok.
+    """
+
+    def __init__(
+        self,
+        store: FeatureStore | None,
+        audio_hash: str,
+        sr: int,
+        load_audio: Callable[[], Tuple[np.ndarray, str]],
+    ):
+        self.store = store
+        self.audio_hash = audio_hash
+        self.sr = sr
+        self._load_audio = load_audio
+        self._audio: Tuple[np.ndarray, str] | None = None
+        self.hits: List[str] = []
+        self.misses: List[str] = []
+        # çalışmış stage -> efektif versiyon (bağımlılar anahtarlarına ekler)
+        self.versions: Dict[str, str] = {}
+
+    @property
+    def audio_loaded(self) -> bool:
+        return self._audio is not None
+
+    def audio(self) -> Tuple[np.ndarray, str]:
+        """(y, wav_path), ilk çağrıda yüklenir."""
+        if self._audio is None:
+            self._audio = self._load_audio()
+        return self._audio
+
+    def run(
+        self,
+        stage: str,
+        version: int | str,
+        compute: Callable[[], Optional[Arrays]],
+        deps: Tuple[str, ...] = (),
+    ) -> Optional[Arrays]:
+        """
+        compute() None dönerse (stage kullanılabilir çıktı üretmedi) store'a yazılmaz.
+        deps: bu stage'in girdisini belirleyen, daha önce run() edilmiş stage'ler;
+        onların versiyonu değişince bu stage de yeniden hesaplanır.
+        """
+        version_key = str(version) + "".join(f"+{d}{self.versions[d]}" for d in deps)
+        self.versions[stage] = version_key
+
+        if self.store is not None:
+            cached = self.store.get(self.audio_hash, stage, version_key, self.sr)
+            if cached is not None:
+                self.hits.append(stage)
+                return cached
+
+        out = compute()
+        self.misses.append(stage)
+        if out is None:
+            return None
+        arrays = {k: np.asarray(v) for k, v in out.items()}
+
+        if self.store is not None:
+            try:
+                self.store.put(self.audio_hash, stage, version_key, self.sr, arrays)
+            except Exception as e:
+                log.warning("feature store: write failed stage=%s hash=%s err=%s", stage, self.audio_hash, e)
+        return arrays
+
+
+@lru_cache(maxsize=1)
+def get_feature_store() -> FeatureStore | None:
+    if not settings.feature_store_dir:
+        return None
+    return FeatureStore(settings.feature_store_dir)
@@ -0,0 +1,311 @@
+# app/services/memory_budget.py
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from app.core.config import settings
+
+log = logging.getLogger("memory_budget")
+
+MB = 1024 * 1024
+
+# Stage başına, sinyal örneği başına tepe byte; tools/bench_memory ile ölçüldü
+# (tracemalloc, 44.1 kHz, 60 s ve 300 s). Stage'ler sırayla çalıştığı için
+# tepe = sinyal + en pahalı stage (300 s'de ölçülen pipeline tepesi 1465 MB,
+# bu tabloyla tahmin ~1590 MB). Frame tabanlı stage'ler hop=512 frame başına
+# ayırdığı için değerler sample rate'ten bağımsız.
+#   tempo:            librosa tempo + tempogram: 384 x n_frames float64 pencereler
+#                     + autocorrelation FFT (complex128) tamponları
+#   frame_stats:      centroid/rolloff/flatness her biri kendi STFT'sini + magnitude'unu alır
+#   frame_timeseries: /analyze/frames; frame_stats serileri + HPSS çıktıları
+#   content_gate:     RMS + ZCR + tam sinyalde flatness STFT'si
+#   lufs:             wav'ı float64 okur + pyloudnorm K-weighting kopyaları
+#   hpss:             bloklu (app.pipeline.hpss); tam boy percussive mel (128) + chroma (12)
+#                     çıktıları ~1.1 B/örnek, blok tamponları ~58 MB (HPSS_BLOCK_BYTES).
+#                     Toplam 300 s'de 5.4 B/örnek, 60 s'de 22.5; kısa parçalarda blok
+#                     sabiti baskın; tabloda 300 s değeri yukarı yuvarlanmış hali
+# musicnn (16 kHz mel patch'leri + TF) ölçülmedi; BASE_BYTES + kalibrasyon karşılar.
+SIGNAL_BYTES_PER_SAMPLE = 4  # float32 y (tüm stage'ler boyunca tutulur)
+STAGE_BYTES_PER_SAMPLE: Dict[str, int] = {
+    "tempo": 112,
+    "frame_stats": 48,
+    "frame_timeseries": 48,
+    "content_gate": 25,
+    "lufs": 24,
+    "hpss": 6,
+}
+# HPSS blok tamponları (STFT, magnitude, iki median, mask'ler; ~60 MB ölçüldü)
+HPSS_BLOCK_BYTES = 64 * MB
+# süreden bağımsız sabit (librosa filtre bankaları, numba cache, musicnn patch'leri,
+# HPSS blok tamponları vs.)
+BASE_BYTES = 64 * MB + HPSS_BLOCK_BYTES
+
+# plan düşürülürken denenen sample rate'ler (yüksekten düşüğe)
+FALLBACK_SAMPLE_RATES = (44100, 32000, 22050, 16000)
+
+
+def estimate_peak_bytes(duration_sec: float, sample_rate: int) -> int:
+    n = max(duration_sec, 0.0) * sample_rate
+    return int(BASE_BYTES + n * (SIGNAL_BYTES_PER_SAMPLE + max(STAGE_BYTES_PER_SAMPLE.values())))
+
+
+@dataclass
+class AnalysisPlan:
+    sample_rate: int
+    duration_sec: float
+    estimated_bytes: int
+    downgraded: bool = False
+    # ffprobe süre veremediyse varsayılan süre kullanıldı: kalibrasyona katılmaz
+    duration_probed: bool = True
+    warnings: List[str] = field(default_factory=list)
+
+
+@dataclass
+class Admission:
+    """
+    reserve()'un verdiği rezervasyon. İstek audio'yu gerçekten decode edip pahalı
+    stage'leri çalıştırdıysa (store hit yok) çağıran measured=True yapar; sadece
+    bu istekler kalibrasyona katılır. Store'dan gelen replay'lerin küçük RSS'i
+    kalibrasyonu aşağı çekip sonraki soğuk isteği eksik rezerve ettirirdi.
+    """
+
+    amount: int
+    measured: bool = False
+
+
+class AdmissionTimeout(RuntimeError):
+    """İstek bütçede yer açılmasını memory_queue_timeout_sec içinde bekleyemedi."""
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+
+class _PeakRssSampler:
+    """
+    İstek süresince process RSS'inin tepe noktası ve o sırada aynı anda çalışan
+    isteklerin toplam (kalibrasyonsuz) tahmininin tepe noktası.
+    """
+
+    def __init__(self, load: Callable[[], int], interval_sec: float = 0.05):
+        self.interval = interval_sec
+        self._load = load
+        self.baseline = _rss_bytes()
+        self.peak = self.baseline
+        self.peak_load = load()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self) -> None:
+        rss = _rss_bytes()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+        self.peak_load = max(self.peak_load, self._load())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def start(self) -> "_PeakRssSampler":
+        if self.baseline is not None:
+            self._thread.start()
+        return self
+
+    def stop(self) -> Optional[int]:
+        """Başlangıca göre tepe RSS artışı."""
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if self.baseline is None or self.peak is None:
+            return None
+        return max(self.peak - self.baseline, 0)
+
+
+class MemoryBudget:
+    """
+    Process başına bellek bütçesi. Her istek tahmini tepe belleğini rezerve eder;
+    yer yoksa kuyrukta bekler. Kuyruk FIFO: önünde bekleyen varken yeni gelen
+    küçük istek sığsa da girmez, yoksa büyük istekler (özellikle bütçenin
+    tamamını tutan "running exclusively" planı) sürekli örtüşen küçüklerin
+    arkasında timeout'a düşerdi. Ölçülen RSS / tahmin oranı EWMA'lanır ve sonraki
+    tahminler bu oranla ölçeklenir:
+      - tek başına çalışan istek: kendi RSS artışı / kendi tahmini (iki yönlü)
+      - eşzamanlı istekler: meşgul dönem başındaki RSS'e göre tepe artış / aynı
+        anda çalışanların toplam tahmininin tepesi. İstekler tepelerine aynı anda
+        çıkmadığı için bu gerçek oranın alt sınırı; sadece kalibrasyonu yükseltir.
+    """
+
+    def __init__(self, total_bytes: int, queue_timeout_sec: float):
+        self.total = total_bytes
+        self.queue_timeout = queue_timeout_sec
+        self.reserved = 0
+        self.in_flight = 0
+        # bekleyenlerin biletleri, geliş sırasıyla; sadece baştaki admit edilebilir
+        self._queue: Deque[object] = deque()
+        self.admissions = 0
+        self.calibration = 1.0
+        # çalışan isteklerin kalibrasyonsuz tahmin toplamı ve meşgul dönem başındaki RSS
+        self.raw_in_flight = 0
+        self.busy_baseline: Optional[int] = None
+        self.history: Deque[Dict[str, float]] = deque(maxlen=50)
+        self._cond: asyncio.Condition | None = None
+
+    def _condition(self) -> asyncio.Condition:
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def estimate(self, duration_sec: float, sample_rate: int) -> int:
+        return int(estimate_peak_bytes(duration_sec, sample_rate) * self.calibration)
+
+    def plan(self, duration_sec: float, sample_rate: int) -> AnalysisPlan:
+        """
+        İstenen sample rate'in tahmini tüm bütçeye sığmıyorsa (hiç admit
+        edilemeyecekse) sığan en yüksek sample rate'e düşer. Hiçbiri sığmazsa
+        en düşük plan bütçenin tamamını tutarak tek başına çalışır.
+        """
+        est = self.estimate(duration_sec, sample_rate)
+        if est <= self.total:
+            return AnalysisPlan(sample_rate, duration_sec, est)
+
+        candidates = [sr for sr in FALLBACK_SAMPLE_RATES if sr < sample_rate]
+        for sr in candidates:
+            est_sr = self.estimate(duration_sec, sr)
+            if est_sr <= self.total:
+                return AnalysisPlan(sr, duration_sec, est_sr, downgraded=True, warnings=[
+                    f"memory budget: sample rate lowered {sample_rate} -> {sr} "
+                    f"(estimated {est / MB:.0f} MB > budget {self.total / MB:.0f} MB)"
+                ])
+
+        sr = candidates[-1] if candidates else sample_rate
+        return AnalysisPlan(sr, duration_sec, self.total, downgraded=sr != sample_rate, warnings=[
+            f"memory budget: estimated {self.estimate(duration_sec, sr) / MB:.0f} MB exceeds budget "
+            f"{self.total / MB:.0f} MB even at {sr} Hz; running exclusively"
+        ])
+
+    @property
+    def waiting(self) -> int:
+        return len(self._queue)
+
+    def would_queue(self, plan: AnalysisPlan) -> bool:
+        """Şu an reserve edilse beklemesi gerekir mi (stream'de "queued" event'i için)."""
+        return bool(self._queue) or self.reserved + min(plan.estimated_bytes, self.total) > self.total
+
+    @asynccontextmanager
+    async def reserve(self, plan: AnalysisPlan) -> AsyncIterator[Admission]:
+        admission = Admission(min(plan.estimated_bytes, self.total))
+        amount = admission.amount
+        cond = self._condition()
+        ticket = object()
+
+        t_wait = time.perf_counter()
+        async with cond:
+            self._queue.append(ticket)
+            try:
+                await asyncio.wait_for(
+                    cond.wait_for(lambda: self._queue[0] is ticket and self.reserved + amount <= self.total),
+                    timeout=self.queue_timeout,
+                )
+            except asyncio.TimeoutError:
+                raise AdmissionTimeout(
+                    f"memory budget: could not reserve {amount / MB:.0f} MB within {self.queue_timeout:.0f}s "
+                    f"(reserved {self.reserved / MB:.0f}/{self.total / MB:.0f} MB, "
+                    f"{self._queue.index(ticket)} queued ahead)"
+                ) from None
+            finally:
+                # timeout / iptal dahil: sıradaki bekleyen baş olabilir
+                self._queue.remove(ticket)
+                cond.notify_all()
+            if self.in_flight == 0:
+                self.busy_baseline = _rss_bytes()
+            raw_estimate = estimate_peak_bytes(plan.duration_sec, plan.sample_rate)
+            self.reserved += amount
+            self.raw_in_flight += raw_estimate
+            self.in_flight += 1
+            self.admissions += 1
+            seq = self.admissions
+            solo = self.in_flight == 1
+            busy_baseline = self.busy_baseline
+        waited_ms = (time.perf_counter() - t_wait) * 1000
+
+        sampler = _PeakRssSampler(lambda: self.raw_in_flight).start()
+        try:
+            yield admission
+        finally:
+            actual = sampler.stop()
+            async with cond:
+                # bu istek süresince başka biri de admit edildiyse RSS artışı paylaşılmıştır
+                solo = solo and self.admissions == seq
+                self.reserved -= amount
+                self.raw_in_flight -= raw_estimate
+                self.in_flight -= 1
+                cond.notify_all()
+            overlap_ratio = None
+            if not solo and busy_baseline is not None and sampler.peak is not None and sampler.peak_load > 0:
+                overlap_ratio = max(sampler.peak - busy_baseline, 0) / sampler.peak_load
+            self._record(plan, seq, actual, solo, overlap_ratio, waited_ms, admission.measured)
+
+    def _record(
+        self,
+        plan: AnalysisPlan,
+        seq: int,
+        actual: Optional[int],
+        solo: bool,
+        overlap_ratio: Optional[float],
+        waited_ms: float,
+        measured: bool,
+    ) -> None:
+        raw_estimate = estimate_peak_bytes(plan.duration_sec, plan.sample_rate)
+        # ilk istek lazy import / numba JIT ısınmasını da ölçer, kalibrasyona katılmaz;
+        # store'dan gelen / yarım kalan istekler tahmin edilen işi yapmadı
+        usable = measured and plan.duration_probed and seq > 1
+        if usable and solo and actual is not None and raw_estimate > BASE_BYTES:
+            ratio = min(max(actual / raw_estimate, 0.25), 4.0)
+            self.calibration = 0.8 * self.calibration + 0.2 * ratio
+        elif usable and overlap_ratio is not None and overlap_ratio > self.calibration:
+            # alt sınır: tahmin kesin düşük, yukarı çek
+            self.calibration = 0.8 * self.calibration + 0.2 * min(overlap_ratio, 4.0)
+
+        self.history.append({
+            "duration_sec": plan.duration_sec,
+            "sample_rate": plan.sample_rate,
+            "estimated_mb": plan.estimated_bytes / MB,
+            "actual_mb": actual / MB if actual is not None else None,
+            "solo": solo,
+            "measured": measured,
+            "overlap_ratio": overlap_ratio,
+            "queued_ms": waited_ms,
+        })
+        log.info(
+            "memory: sr=%s dur=%.1fs estimated=%.0fMB actual=%s solo=%s measured=%s queued_ms=%.0f calibration=%.2f",
+            plan.sample_rate, plan.duration_sec, plan.estimated_bytes / MB,
+            f"{actual / MB:.0f}MB" if actual is not None else "n/a", solo, measured, waited_ms, self.calibration,
+        )
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "budget_mb": self.total / MB,
+            "reserved_mb": self.reserved / MB,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calibration": self.calibration,
+            "recent": list(self.history),
+        }
+
+
+memory_budget = MemoryBudget(
+    total_bytes=settings.memory_budget_mb * MB,
+    queue_timeout_sec=settings.memory_queue_timeout_sec,
+)
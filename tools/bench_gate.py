@@ -0,0 +1,168 @@
+# tools/bench_gate.py
+"""
+Content gate eşik kontrolü: bilinen türde sentetik parçalar -> analyze_content_gate.
+
+Her durum için beklenen içerik türü, gate kararı ve kararı veren özellikler
+(aktif frame flatness medyanı, pause oranı, ZCR değişkenliği, onset
+periyodikliği, harmonik tepe kararlılığı) raporlanır. Özellikle seyrek müziğin
+(notalar / vuruşlar arası sessizlik veya hışırtı) "noise"/"speech" diye
+işaretlenip tempo/key/genre kaybetmemesi kontrol edilir.
+
+    python -m tools.bench_gate --seeds 3
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from app.pipeline.gate import analyze_content_gate, compute_gate_features
+from tools.bench_hpss import synth_reference
+
+SR = 44100
+
+
+def _pluck(f0: float, dur: float, sr: int) -> np.ndarray:
+    t = np.arange(int(dur * sr)) / sr
+    y = sum(np.sin(2 * np.pi * f0 * h * t) / h for h in range(1, 6))
+    return (y * np.exp(-t * 4.0)).astype(np.float32)
+
+
+def sparse_plucks(rng: np.random.Generator, gap_ratio: float, floor_dbfs: float | None, sr: int = SR) -> np.ndarray:
+    """Sabit aralıkla (100 BPM) pentatonik notalar; periyodun gap_ratio'su sessiz/floor."""
+    period = 0.6
+    note = period * (1.0 - gap_ratio)
+    scale = [261.63, 293.66, 329.63, 392.00, 440.00]
+    parts = []
+    for _ in range(int(30 / period)):
+        p = np.zeros(int(period * sr), dtype=np.float32)
+        n = _pluck(float(rng.choice(scale)), note, sr)
+        p[: len(n)] = 0.5 * n
+        parts.append(p)
+    y = np.concatenate(parts)
+    if floor_dbfs is not None:
+        y += (10 ** (floor_dbfs / 20) * rng.standard_normal(len(y))).astype(np.float32)
+    return y
+
+
+def rubato_plucks(rng: np.random.Generator, floor_dbfs: float, sr: int = SR) -> np.ndarray:
+    """Serbest zamanlı (rubato, düzenli vuruş yok) notalar: aralar 0.3-1.6 s rastgele, nota aranın %60'ı çalar."""
+    scale = [196.00, 220.00, 261.63, 293.66, 329.63, 392.00, 440.00, 523.25]
+    parts = []
+    total = 0.0
+    while total < 30.0:
+        gap = float(rng.uniform(0.3, 1.6))
+        p = np.zeros(int(gap * sr), dtype=np.float32)
+        n = _pluck(float(rng.choice(scale)), 0.6 * gap, sr)
+        p[: len(n)] = 0.5 * n
+        parts.append(p)
+        total += gap
+    y = np.concatenate(parts)
+    return y + (10 ** (floor_dbfs / 20) * rng.standard_normal(len(y))).astype(np.float32)
+
+
+def drums_loop(rng: np.random.Generator, bpm: float = 120.0, sr: int = SR) -> np.ndarray:
+    """Sadece davul: kick 1/3, snare 2/4, hihat sekizlik; aralar dijital sessizlik."""
+    beat = 60.0 / bpm
+    n = int(30 * sr)
+    y = np.zeros(n, dtype=np.float32)
+    k = np.arange(int(0.12 * sr)) / sr
+    kick = np.exp(-k * 30) * np.sin(2 * np.pi * (50 + 90 * np.exp(-k * 40)) * k)
+    snare_len, hat_len = int(0.15 * sr), int(0.04 * sr)
+    for j, start in enumerate(np.arange(0, 30 - 0.2, beat / 2)):
+        s = int(start * sr)
+        hat = rng.standard_normal(hat_len) * np.exp(-np.arange(hat_len) / (0.008 * sr))
+        y[s:s + hat_len] += 0.2 * hat
+        if j % 4 == 0:
+            y[s:s + len(kick)] += 0.8 * kick
+        if j % 4 == 2:
+            y[s:s + snare_len] += 0.4 * rng.standard_normal(snare_len) * np.exp(-np.arange(snare_len) / (0.03 * sr))
+    return y
+
+
+def speech_like(rng: np.random.Generator, sr: int = SR) -> np.ndarray:
+    """
+    Hece benzeri parçalar: kayan F0 (90-220 Hz) + kayan formant ağırlıklı harmonikler,
+    aralarda sürtünmeli (fricative) gürültü, düzensiz hece / kelime araları.
+    """
+    parts: List[np.ndarray] = []
+    for _ in range(60):
+        dur = rng.uniform(0.08, 0.30)
+        t = np.arange(int(dur * sr)) / sr
+        f0 = rng.uniform(90, 220) * (1 + rng.uniform(-0.25, 0.25) * t / dur)
+        phase = 2 * np.pi * np.cumsum(f0) / sr
+        formant = rng.uniform(400, 900) * (1 + rng.uniform(-0.5, 0.5) * t / dur)
+        v = np.zeros_like(t)
+        for h in range(1, 25):
+            v += np.sin(h * phase) * np.exp(-((h * f0 - formant) / 300.0) ** 2)
+        parts.append((0.3 * v * np.hanning(len(t))).astype(np.float32))
+        if rng.random() < 0.4:
+            m = int(rng.uniform(0.04, 0.12) * sr)
+            parts.append((0.04 * rng.standard_normal(m) * np.hanning(m)).astype(np.float32))
+        gap = rng.uniform(0.03, 0.12) if rng.random() < 0.7 else rng.uniform(0.25, 0.6)
+        parts.append(np.zeros(int(gap * sr), dtype=np.float32))
+    y = np.concatenate(parts)
+    return y + (1e-4 * rng.standard_normal(len(y))).astype(np.float32)
+
+
+CASES: Dict[str, Tuple[str, Callable[[np.random.Generator], np.ndarray]]] = {
+    "dense_music": ("music", lambda r: synth_reference(30, SR, float(r.uniform(80, 160)), int(r.integers(12)), "major", 0)),
+    "drums_only": ("music", drums_loop),
+    "plucks_gap40_silence": ("music", lambda r: sparse_plucks(r, 0.4, None)),
+    "plucks_gap60_silence": ("music", lambda r: sparse_plucks(r, 0.6, None)),
+    "plucks_gap40_floor80": ("music", lambda r: sparse_plucks(r, 0.4, -80.0)),
+    "plucks_gap60_floor80": ("music", lambda r: sparse_plucks(r, 0.6, -80.0)),
+    "rubato_plucks_floor70": ("music", lambda r: rubato_plucks(r, -70.0)),
+    "music_padded": ("music", lambda r: np.concatenate([
+        np.zeros(3 * SR, np.float32), synth_reference(20, SR, 120.0, 0, "minor", 1), np.zeros(5 * SR, np.float32)])),
+    "speech_like": ("speech", speech_like),
+    "white_noise": ("noise", lambda r: (0.2 * r.standard_normal(30 * SR)).astype(np.float32)),
+    "pink_noise": ("noise", lambda r: _pink(r, 30 * SR)),
+    "silence": ("silence", lambda r: (1e-5 * r.standard_normal(10 * SR)).astype(np.float32)),
+}
+
+
+def _pink(rng: np.random.Generator, n: int) -> np.ndarray:
+    spec = np.fft.rfft(rng.standard_normal(n))
+    spec /= np.sqrt(np.maximum(np.arange(len(spec)), 1))
+    y = np.fft.irfft(spec, n)
+    return (0.2 * y / np.std(y)).astype(np.float32)
+
+
+def run(seeds: int) -> Dict[str, object]:
+    rows: Dict[str, object] = {}
+    correct = total = 0
+    for name, (expected, make) in CASES.items():
+        got: List[str] = []
+        feats: List[Dict[str, float]] = []
+        for seed in range(seeds):
+            y = make(np.random.default_rng(seed))
+            got.append(str(analyze_content_gate(y, SR)["content"]))
+            f = compute_gate_features(y, SR)
+            feats.append({k: v for k, v in f.items() if isinstance(v, float)})
+        ok = sum(g == expected for g in got)
+        correct += ok
+        total += len(got)
+        keys = feats[0].keys()
+        rows[name] = {
+            "expected": expected,
+            "got": got,
+            "correct": f"{ok}/{len(got)}",
+            **{k: [round(f[k], 2) for f in feats] for k in keys},
+        }
+    return {"correct": f"{correct}/{total}", "cases": rows}
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Check content gate thresholds on synthetic audio")
+    ap.add_argument("--seeds", type=int, default=3)
+    args = ap.parse_args(argv)
+    print(json.dumps(run(args.seeds), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
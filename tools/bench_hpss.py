@@ -0,0 +1,160 @@
+# tools/bench_hpss.py
+"""
+HPSS motoru karşılaştırması: librosa.effects.hpss yolu vs app.pipeline.hpss (exact / fast).
+
+Bilinen BPM ve tonalitede sentetik referans parçalar üretir (harmonik
+partial'lı I-IV-V-I / i-iv-V-i akor yürüyüşü + bas + kick/hihat), her yolla
+onset envelope + chroma hesaplayıp aynı heuristics'ten (bpm_from_onset_envelope,
+key_from_chroma_mean) geçirir; süreyi, BPM hatasını ve key isabetini raporlar.
+BPM hatası iki türlü: strict (gerçek tempoya göre) ve metrik seviye toleranslı
+(x1/2, x2, x1/3, x3 içinden en yakını, MIREX Acc2 gibi). Ayrıca her yolun eski
+librosa yolundan sapması (BPM farkı, aynı key kararı) verilir.
+
+    python -m tools.bench_hpss --tracks 12 --duration 30
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import librosa
+
+from app.pipeline.hpss import compute_hpss_features
+from app.pipeline.key import KEY_NAMES, key_from_chroma_mean
+from app.pipeline.tempo import bpm_from_onset_envelope
+
+MAJOR_PROGRESSION = ((0, 4, 7), (5, 9, 12), (7, 11, 14), (0, 4, 7))
+MINOR_PROGRESSION = ((0, 3, 7), (5, 8, 12), (7, 11, 14), (0, 3, 7))
+# metrik seviye toleranslı BPM hatası için denenen katlar
+METRICAL_FACTORS = (1.0, 0.5, 2.0, 1.0 / 3.0, 3.0)
+
+
+def synth_reference(duration_sec: float, sr: int, bpm: float, tonic: int, scale: str, seed: int) -> np.ndarray:
+    """Akor başına bir ölçü (4 vuruş); kick her vuruşta, hihat sekizliklerde."""
+    rng = np.random.default_rng(seed)
+    n = int(duration_sec * sr)
+    t = np.arange(n, dtype=np.float32) / sr
+    y = np.zeros(n, dtype=np.float32)
+
+    beat = 60.0 / bpm
+    bar = int(4 * beat * sr)
+    progression = MAJOR_PROGRESSION if scale == "major" else MINOR_PROGRESSION
+    root_hz = 261.63 * 2 ** (tonic / 12)  # C4 + tonic
+
+    for i, start in enumerate(range(0, n, bar)):
+        end = min(start + bar, n)
+        seg = t[start:end]
+        env = np.minimum(1.0, (seg - seg[0]) * 20).astype(np.float32)
+        chord = progression[i % len(progression)]
+        for semi in chord:
+            f = root_hz * 2 ** (semi / 12)
+            for h, a in ((1, 1.0), (2, 0.4), (3, 0.2)):
+                y[start:end] += 0.06 * a * env * np.sin(2 * np.pi * f * h * seg)
+        # bas: akor kökü iki oktav aşağıda
+        y[start:end] += 0.10 * env * np.sin(2 * np.pi * root_hz * 2 ** (chord[0] / 12) / 4 * seg)
+
+    kick_len = int(0.08 * sr)
+    k = np.arange(kick_len) / sr
+    kick = (np.exp(-k * 40) * np.sin(2 * np.pi * (50 + 80 * np.exp(-k * 30)) * k)).astype(np.float32)
+    hat_len = int(0.02 * sr)
+    for j, start in enumerate(np.arange(0, duration_sec, beat / 2)):
+        s = int(start * sr)
+        if j % 2 == 0 and s + kick_len <= n:
+            y[s:s + kick_len] += 0.7 * kick
+        if s + hat_len <= n:
+            hat = rng.standard_normal(hat_len).astype(np.float32) * np.exp(-np.arange(hat_len) / (0.004 * sr))
+            y[s:s + hat_len] += 0.15 * hat.astype(np.float32)
+
+    y += 0.005 * rng.standard_normal(n).astype(np.float32)
+    return y / max(float(np.max(np.abs(y))), 1e-9) * 0.9
+
+
+def librosa_path(y: np.ndarray, sr: int) -> Dict[str, np.ndarray]:
+    """Eski pipeline: tempo ve key stage'leri ayrı ayrı effects.hpss çalıştırırdı."""
+    _, y_perc = librosa.effects.hpss(y)
+    onset_env = librosa.onset.onset_strength(y=y_perc, sr=sr)
+    y_harm, _ = librosa.effects.hpss(y)
+    chroma = librosa.feature.chroma_cqt(y=y_harm, sr=sr)
+    return {"onset_env": onset_env, "chroma": chroma}
+
+
+PATHS: Dict[str, Callable[[np.ndarray, int], Dict[str, np.ndarray]]] = {
+    "librosa": librosa_path,
+    "spectral_exact": lambda y, sr: compute_hpss_features(y, sr, mode="exact"),
+    "spectral_fast": lambda y, sr: compute_hpss_features(y, sr, mode="fast"),
+}
+
+
+def _bpm_error(est: float, true: float, factors: Tuple[float, ...] = (1.0,)) -> float:
+    return min(abs(est - true * f) / (true * f) for f in factors) * 100.0
+
+
+def run(tracks: int, duration: float, sr: int, seed: int) -> Dict[str, object]:
+    rng = np.random.default_rng(seed)
+    refs: List[Tuple[float, int, str]] = [
+        (float(rng.uniform(70, 170)), int(rng.integers(12)), "major" if i % 2 == 0 else "minor")
+        for i in range(tracks)
+    ]
+
+    rows: Dict[str, Dict[str, list]] = {
+        name: {"sec": [], "bpm": [], "bpm_err_pct": [], "bpm_err_metrical_pct": [], "key": [], "key_ok": []}
+        for name in PATHS
+    }
+    for i, (bpm, tonic, scale) in enumerate(refs):
+        y = synth_reference(duration, sr, bpm, tonic, scale, seed + i)
+        for name, fn in PATHS.items():
+            t0 = time.perf_counter()
+            out = fn(y, sr)
+            rows[name]["sec"].append(time.perf_counter() - t0)
+
+            est_bpm, _ = bpm_from_onset_envelope(out["onset_env"], sr)
+            key_name, key_scale, _ = key_from_chroma_mean(np.mean(out["chroma"], axis=1))
+            rows[name]["bpm"].append(est_bpm)
+            rows[name]["bpm_err_pct"].append(_bpm_error(est_bpm, bpm))
+            rows[name]["bpm_err_metrical_pct"].append(_bpm_error(est_bpm, bpm, METRICAL_FACTORS))
+            rows[name]["key"].append((key_name, key_scale))
+            rows[name]["key_ok"].append(key_name == KEY_NAMES[tonic] and key_scale == scale)
+
+    base = rows["librosa"]
+    summary = {}
+    for name, r in rows.items():
+        sec = float(np.mean(r["sec"]))
+        err = np.asarray(r["bpm_err_pct"])
+        err_m = np.asarray(r["bpm_err_metrical_pct"])
+        delta = np.abs(np.asarray(r["bpm"]) - np.asarray(base["bpm"]))
+        summary[name] = {
+            "sec_per_track": round(sec, 3),
+            "speedup": round(float(np.mean(base["sec"])) / sec, 2),
+            "bpm_within_4pct": f"{int(np.sum(err <= 4.0))}/{len(err)}",
+            "bpm_within_4pct_metrical": f"{int(np.sum(err_m <= 4.0))}/{len(err_m)}",
+            "bpm_err_metrical_pct_mean": round(float(err_m.mean()), 2),
+            "bpm_delta_vs_librosa_max": round(float(delta.max()), 2),
+            "key_correct": f"{int(np.sum(r['key_ok']))}/{len(r['key_ok'])}",
+            "key_same_as_librosa": f"{sum(a == b for a, b in zip(r['key'], base['key']))}/{len(r['key'])}",
+        }
+    return {"tracks": tracks, "duration_sec": duration, "sample_rate": sr, "paths": summary}
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Compare HPSS engines on synthetic reference audio")
+    ap.add_argument("--tracks", type=int, default=12)
+    ap.add_argument("--duration", type=float, default=30.0)
+    ap.add_argument("--sr", type=int, default=44100)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args(argv)
+
+    # numba JIT / filtre bankası ısınması ilk ölçüme binmesin
+    warm = synth_reference(5.0, args.sr, 120.0, 0, "major", 0)
+    for fn in PATHS.values():
+        fn(warm, args.sr)
+
+    print(json.dumps(run(args.tracks, args.duration, args.sr, args.seed), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
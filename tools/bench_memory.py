@@ -0,0 +1,107 @@
+# tools/bench_memory.py
+"""
+Stage başına tepe bellek ölçümü (memory_budget.STAGE_BYTES_PER_SAMPLE için).
+
+Sentetik bir parça (tools.bench_hpss.synth_reference) üretir, her stage
+fonksiyonunu tracemalloc altında ayrı ayrı çalıştırıp girdiler hariç tepe
+ayırımı örnek başına byte olarak raporlar; sonra _iter_stages'in tamamını
+(store'suz) ölçüp estimate_peak_bytes ile karşılaştırır. Süreden bağımsız
+sabiti ayırmak için iki farklı sürede çalıştırın:
+
+    python -m tools.bench_memory --durations 60,300
+
+tracemalloc numpy ayırımlarını görür; numba / FFT plan cache'leri gibi native
+ayırımlar dahil değil (onlar BASE_BYTES ve EWMA kalibrasyonunda).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+import soundfile as sf
+
+from app.pipeline.features import compute_frame_stats
+from app.pipeline.frames import compute_frame_timeseries
+from app.pipeline.gate import analyze_content_gate
+from app.pipeline.hpss import compute_hpss_features
+from app.pipeline.loudness import compute_lufs
+from app.pipeline.tempo import bpm_from_onset_envelope
+from app.services.analyzer_service import AnalyzerService
+from app.services.feature_store import StageRunner
+from app.services.memory_budget import MB, estimate_peak_bytes
+from tools.bench_hpss import synth_reference
+
+
+def _peak(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def _load(wav_path: str, sr: int) -> np.ndarray:
+    import librosa
+
+    y, _ = librosa.load(wav_path, sr=sr, mono=True)
+    return y
+
+
+def measure(duration: float, sr: int, wav_path: str) -> Dict[str, object]:
+    y = synth_reference(duration, sr, 120.0, 0, "major", 0)
+    sf.write(wav_path, y, sr, subtype="PCM_16")
+    n = len(y)
+    onset_env = compute_hpss_features(y, sr, chroma=False)["onset_env"]
+
+    stages: List[Tuple[str, Callable[[], object]]] = [
+        ("load", lambda: _load(wav_path, sr)),
+        ("content_gate", lambda: analyze_content_gate(y, sr)),
+        ("lufs", lambda: compute_lufs(wav_path)),
+        ("hpss", lambda: compute_hpss_features(y, sr, mode="exact")),
+        ("tempo", lambda: bpm_from_onset_envelope(onset_env, sr)),
+        ("frame_stats", lambda: compute_frame_stats(y, sr)),
+        ("frame_timeseries", lambda: compute_frame_timeseries(y, sr)),
+    ]
+    out: Dict[str, object] = {}
+    for name, fn in stages:
+        fn()  # ısınma (lazy import, filtre bankaları)
+        out[name] = round(_peak(fn) / n, 2)
+
+    def iter_all() -> None:
+        runner = StageRunner(None, "bench", sr, lambda: (_load(wav_path, sr), wav_path))
+        for _ in AnalyzerService()._iter_stages(runner, "full", False, False, time.perf_counter()):
+            pass
+
+    total = _peak(iter_all)
+    return {
+        "duration_sec": duration,
+        "sample_rate": sr,
+        "stage_bytes_per_sample": out,
+        "pipeline_peak_mb": round(total / MB, 1),
+        "estimate_mb": round(estimate_peak_bytes(duration, sr) / MB, 1),
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Measure per-stage peak memory")
+    ap.add_argument("--durations", default="60,300", help="saniye, virgülle")
+    ap.add_argument("--sr", type=int, default=44100)
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        wav_path = os.path.join(tmp, "bench.wav")
+        rows = [measure(float(d), args.sr, wav_path) for d in args.durations.split(",")]
+    print(json.dumps(rows, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,509 @@
+# tools/loadtest.py
+"""
+/analyze için HTTP load test.
+
+Sentetik upload'ları (farklı süre + format) kademeli concurrency seviyelerinde
+gönderir; her seviye için throughput, p50/p95/p99 latency, error rate ve
+sunucu process'inin CPU / RSS değerlerini JSON olarak raporlar.
+
+Örnekler:
+    # yerel uvicorn başlat (2 worker), fast vs full karşılaştır
+    python -m tools.loadtest --workers 2 --preset fast --concurrency 1,2,4,8 --out fast.json
+    python -m tools.loadtest --workers 2 --preset full --concurrency 1,2,4,8 --out full.json
+
+    # app.main'i aynı process içinde (thread'de) çalıştır
+    python -m tools.loadtest --in-process --concurrency 1,2
+
+    # zaten çalışan bir servise karşı (CPU/RSS için --server-pid verilebilir)
+    python -m tools.loadtest --url http://127.0.0.1:8000 --server-pid 1234
+
+stdlib + numpy dışında bağımlılık yok; mp3/flac/ogg için PATH'te ffmpeg gerekir (yoksa o formatlar atlanır).
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+from urllib.parse import urlencode, urlparse
+
+import numpy as np
+
+CONTENT_TYPES = {
+    "wav": "audio/wav",
+    "mp3": "audio/mpeg",
+    "flac": "audio/flac",
+    "ogg": "audio/ogg",
+    "m4a": "audio/mp4",
+}
+
+
+# ---------------------------------------------------------------------------
+# synthetic audio
+# ---------------------------------------------------------------------------
+
+def synth_wav_bytes(duration_sec: float, sr: int = 44100, bpm: float = 120.0, seed: int = 0) -> bytes:
+    """
+    Mono 16-bit wav: C major akor pad + bpm'de kick benzeri click + biraz noise.
+    Tempo/key stage'leri gerçekçi iş yapsın diye boş sinüs değil.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(duration_sec * sr)
+    t = np.arange(n, dtype=np.float32) / sr
+
+    y = np.zeros(n, dtype=np.float32)
+    for f in (261.63, 329.63, 392.00):
+        y += 0.12 * np.sin(2 * np.pi * f * t).astype(np.float32)
+
+    beat = int(sr * 60.0 / bpm)
+    click_len = min(int(0.03 * sr), n)
+    click = (np.exp(-np.linspace(0, 8, click_len)) * np.sin(2 * np.pi * 60 * np.arange(click_len) / sr)).astype(np.float32)
+    for start in range(0, n - click_len, beat):
+        y[start:start + click_len] += 0.6 * click
+
+    y += 0.01 * rng.standard_normal(n).astype(np.float32)
+    pcm = (np.clip(y, -1.0, 1.0) * 32767).astype("<i2")
+
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sr)
+        w.writeframes(pcm.tobytes())
+    return buf.getvalue()
+
+
+def transcode(wav_bytes: bytes, fmt: str) -> Optional[bytes]:
+    if fmt == "wav":
+        return wav_bytes
+    if shutil.which("ffmpeg") is None:
+        return None
+    extra = {"m4a": ["-f", "ipod"], "ogg": ["-f", "ogg"], "mp3": ["-f", "mp3"], "flac": ["-f", "flac"]}[fmt]
+    p = subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", "pipe:0", *extra, "pipe:1"],
+        input=wav_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    if p.returncode != 0:
+        return None
+    return p.stdout
+
+
+@dataclass
+class Payload:
+    name: str
+    fmt: str
+    duration_sec: float
+    body: bytes
+
+
+def build_payloads(durations: List[float], formats: List[str], warnings: List[str]) -> List[Payload]:
+    out: List[Payload] = []
+    for i, d in enumerate(durations):
+        wav_bytes = synth_wav_bytes(d, seed=i)
+        for fmt in formats:
+            body = transcode(wav_bytes, fmt)
+            if body is None:
+                warnings.append(f"format {fmt} skipped (ffmpeg missing or failed)")
+                continue
+            out.append(Payload(name=f"synth_{int(d)}s.{fmt}", fmt=fmt, duration_sec=d, body=body))
+    return out
+
+
+# ---------------------------------------------------------------------------
+# server lifecycle
+# ---------------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_healthy(base_url: str, timeout_sec: float) -> None:
+    u = urlparse(base_url)
+    deadline = time.monotonic() + timeout_sec
+    last_err: Exception | None = None
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(u.hostname, u.port, timeout=2)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                return
+        except Exception as e:
+            last_err = e
+        time.sleep(0.2)
+    raise RuntimeError(f"server not healthy at {base_url}: {last_err}")
+
+
+class LocalUvicorn:
+    """`uvicorn app.main:app` alt process'i (opsiyonel --workers N)."""
+
+    def __init__(self, workers: int, port: int | None = None):
+        self.port = port or _free_port()
+        self.workers = workers
+        self.proc: subprocess.Popen | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "LocalUvicorn":
+        cmd = [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(self.port),
+            "--workers", str(self.workers), "--log-level", "warning",
+        ]
+        self.proc = subprocess.Popen(cmd)
+        _wait_healthy(self.url, timeout_sec=60)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.proc and self.proc.poll() is None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+class InProcessUvicorn:
+    """app.main:app'i aynı process'te bir thread içinde çalıştırır (CPU/RSS client'ı da içerir)."""
+
+    def __init__(self, port: int | None = None):
+        self.port = port or _free_port()
+        self.server = None
+        self.thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "InProcessUvicorn":
+        import uvicorn
+        from app.main import app
+
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+        _wait_healthy(self.url, timeout_sec=60)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        if self.server is not None:
+            self.server.should_exit = True
+        if self.thread is not None:
+            self.thread.join(timeout=15)
+
+
+# ---------------------------------------------------------------------------
+# resource sampling (/proc, linux)
+# ---------------------------------------------------------------------------
+
+def _proc_tree(root_pid: int) -> List[int]:
+    """root + tüm alt process'ler (uvicorn --workers çocukları dahil)."""
+    children: Dict[int, List[int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except Exception:
+            continue
+        children.setdefault(ppid, []).append(int(entry))
+
+    out, stack = [], [root_pid]
+    while stack:
+        pid = stack.pop()
+        out.append(pid)
+        stack.extend(children.get(pid, []))
+    return out
+
+
+def _cpu_ticks(pid: int) -> int:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return int(fields[11]) + int(fields[12])  # utime + stime
+
+
+def _rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+class ResourceSampler:
+    """Arka plan thread'i: process ağacının CPU% ve toplam RSS'ini periyodik örnekler."""
+
+    def __init__(self, pid: int | None, interval_sec: float = 0.25):
+        self.pid = pid
+        self.interval = interval_sec
+        self.cpu_samples: List[float] = []
+        self.rss_samples: List[int] = []
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self.available = pid is not None and os.path.exists("/proc/self/stat")
+
+    def _snapshot(self) -> tuple[int, int]:
+        ticks, rss = 0, 0
+        for p in _proc_tree(self.pid):
+            try:
+                ticks += _cpu_ticks(p)
+                rss += _rss_bytes(p)
+            except Exception:
+                continue
+        return ticks, rss
+
+    def _run(self) -> None:
+        hz = os.sysconf("SC_CLK_TCK")
+        prev_ticks, _ = self._snapshot()
+        prev_t = time.monotonic()
+        while True:
+            stopped = self._stop.wait(self.interval)
+            ticks, rss = self._snapshot()
+            now = time.monotonic()
+            self.cpu_samples.append(100.0 * (ticks - prev_ticks) / hz / max(now - prev_t, 1e-6))
+            self.rss_samples.append(rss)
+            prev_ticks, prev_t = ticks, now
+            # seviye interval'den kısa sürse bile en az bir örnek kalsın
+            if stopped:
+                return
+
+    def __enter__(self) -> "ResourceSampler":
+        if self.available:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        if not self.cpu_samples:
+            return {"cpu_percent_mean": None, "cpu_percent_max": None, "rss_mb_peak": None}
+        return {
+            "cpu_percent_mean": float(np.mean(self.cpu_samples)),
+            "cpu_percent_max": float(np.max(self.cpu_samples)),
+            "rss_mb_peak": float(np.max(self.rss_samples)) / (1024 * 1024),
+        }
+
+
+# ---------------------------------------------------------------------------
+# load generation
+# ---------------------------------------------------------------------------
+
+def _multipart(payload: Payload) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{payload.name}"\r\n'
+        f"Content-Type: {CONTENT_TYPES[payload.fmt]}\r\n\r\n"
+    ).encode()
+    tail = f"\r\n--{boundary}--\r\n".encode()
+    return head + payload.body + tail, f"multipart/form-data; boundary={boundary}"
+
+
+@dataclass
+class Sample:
+    payload: str
+    status: int
+    latency_ms: float
+    error: str | None = None
+
+
+def _send(base_url: str, path: str, payload: Payload, timeout_sec: float) -> Sample:
+    u = urlparse(base_url)
+    body, ctype = _multipart(payload)
+    t0 = time.perf_counter()
+    try:
+        conn = http.client.HTTPConnection(u.hostname, u.port, timeout=timeout_sec)
+        conn.request("POST", path, body=body, headers={"Content-Type": ctype})
+        resp = conn.getresponse()
+        resp.read()
+        conn.close()
+        ms = (time.perf_counter() - t0) * 1000
+        err = None if resp.status == 200 else f"HTTP {resp.status}"
+        return Sample(payload.name, resp.status, ms, err)
+    except Exception as e:
+        return Sample(payload.name, 0, (time.perf_counter() - t0) * 1000, f"{type(e).__name__}: {e}")
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    return float(np.percentile(np.asarray(values, dtype=float), q))
+
+
+@dataclass
+class LevelReport:
+    concurrency: int
+    requests: int
+    errors: int
+    wall_sec: float
+    samples: List[Sample] = field(default_factory=list)
+    resources: Dict[str, Optional[float]] = field(default_factory=dict)
+
+    def to_dict(self) -> Dict:
+        ok = [s.latency_ms for s in self.samples if s.error is None]
+        by_payload: Dict[str, List[float]] = {}
+        for s in self.samples:
+            if s.error is None:
+                by_payload.setdefault(s.payload, []).append(s.latency_ms)
+        error_kinds: Dict[str, int] = {}
+        for s in self.samples:
+            if s.error is not None:
+                error_kinds[s.error] = error_kinds.get(s.error, 0) + 1
+
+        return {
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "error_kinds": error_kinds,
+            "wall_sec": self.wall_sec,
+            "throughput_rps": (self.requests - self.errors) / self.wall_sec if self.wall_sec > 0 else 0.0,
+            "latency_ms": {
+                "p50": _percentile(ok, 50),
+                "p95": _percentile(ok, 95),
+                "p99": _percentile(ok, 99),
+                "mean": float(np.mean(ok)) if ok else None,
+                "max": float(np.max(ok)) if ok else None,
+            },
+            "latency_ms_p50_by_payload": {k: _percentile(v, 50) for k, v in sorted(by_payload.items())},
+            **self.resources,
+        }
+
+
+def run_level(
+    base_url: str,
+    path: str,
+    payloads: List[Payload],
+    concurrency: int,
+    n_requests: int,
+    timeout_sec: float,
+    server_pid: int | None,
+) -> LevelReport:
+    # payload'ları round-robin dağıt -> her seviyede aynı süre/format karışımı
+    jobs = [payloads[i % len(payloads)] for i in range(n_requests)]
+
+    with ResourceSampler(server_pid) as sampler:
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(lambda p: _send(base_url, path, p, timeout_sec), jobs))
+        wall = time.perf_counter() - t0
+
+    return LevelReport(
+        concurrency=concurrency,
+        requests=len(samples),
+        errors=sum(1 for s in samples if s.error is not None),
+        wall_sec=wall,
+        samples=samples,
+        resources=sampler.summary(),
+    )
+
+
+def _csv_list(s: str, cast) -> list:
+    return [cast(x) for x in s.split(",") if x.strip()]
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Load test for the /analyze endpoint")
+    target = ap.add_mutually_exclusive_group()
+    target.add_argument("--url", help="mevcut servis (örn. http://127.0.0.1:8000); verilmezse yerel uvicorn başlatılır")
+    target.add_argument("--in-process", action="store_true", help="app.main'i bu process içinde çalıştır")
+    ap.add_argument("--workers", type=int, default=1, help="yerel uvicorn --workers")
+    ap.add_argument("--server-pid", type=int, default=None, help="--url ile CPU/RSS ölçmek için sunucu pid'i")
+    ap.add_argument("--preset", choices=["fast", "full"], default="full")
+    ap.add_argument("--concurrency", default="1,2,4,8", help="virgülle ayrılmış concurrency seviyeleri")
+    ap.add_argument("--requests-per-level", type=int, default=16)
+    ap.add_argument("--durations", default="10,30,120", help="sentetik parça süreleri (sn)")
+    ap.add_argument("--formats", default="wav,mp3", help="wav,mp3,flac,ogg,m4a")
+    ap.add_argument("--warmup", type=int, default=1, help="ölçüm öncesi istek sayısı")
+    ap.add_argument("--timeout", type=float, default=600.0, help="istek başına timeout (sn)")
+    ap.add_argument("--out", default=None, help="JSON rapor dosyası (yoksa stdout)")
+    args = ap.parse_args(argv)
+
+    warnings: List[str] = []
+    payloads = build_payloads(_csv_list(args.durations, float), _csv_list(args.formats, str), warnings)
+    if not payloads:
+        print("no payloads could be built", file=sys.stderr)
+        return 2
+
+    query = urlencode({"preset": args.preset, "include_instruments": "false"})
+    path = f"/analyze?{query}"
+
+    if args.url:
+        server_ctx = None
+        base_url, server_pid, mode = args.url, args.server_pid, "external"
+    elif args.in_process:
+        server_ctx = InProcessUvicorn()
+        mode = "in_process"
+    else:
+        server_ctx = LocalUvicorn(workers=args.workers)
+        mode = "local_uvicorn"
+
+    levels: List[Dict] = []
+    try:
+        if server_ctx is not None:
+            server_ctx.__enter__()
+            base_url = server_ctx.url
+            server_pid = server_ctx.proc.pid if isinstance(server_ctx, LocalUvicorn) else os.getpid()
+
+        for _ in range(args.warmup):
+            _send(base_url, path, payloads[0], args.timeout)
+
+        for c in _csv_list(args.concurrency, int):
+            rep = run_level(base_url, path, payloads, c, args.requests_per_level, args.timeout, server_pid)
+            d = rep.to_dict()
+            levels.append(d)
+            print(
+                f"c={c:<3d} rps={d['throughput_rps']:.2f} p50={d['latency_ms']['p50']} "
+                f"p95={d['latency_ms']['p95']} err={d['error_rate']:.2%} rss_mb={d['rss_mb_peak']}",
+                file=sys.stderr,
+            )
+    finally:
+        if server_ctx is not None:
+            server_ctx.__exit__(None, None, None)
+
+    report = {
+        "config": {
+            "mode": mode,
+            "url": base_url,
+            "workers": args.workers if mode == "local_uvicorn" else None,
+            "preset": args.preset,
+            "requests_per_level": args.requests_per_level,
+            "payloads": [
+                {"name": p.name, "format": p.fmt, "duration_sec": p.duration_sec, "bytes": len(p.body)}
+                for p in payloads
+            ],
+            "cpu_count": os.cpu_count(),
+        },
+        "warnings": sorted(set(warnings)),
+        "levels": levels,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
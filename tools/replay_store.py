@@ -0,0 +1,82 @@
+# tools/replay_store.py
+"""
+Feature store'daki tüm parçaları audio decode etmeden yeniden analiz eder.
+
+build_ai_summary / audio_features_from_stats heuristics'i değiştiğinde katalogu
+baştan decode + HPSS + musicnn ile koşmak yerine kayıtlı ara çıktılar
+(onset_env, chroma_mean, frame_stats, taggram_avg, lufs) üzerinden replay yapar.
+Versiyonu değişmiş bir pahalı stage'i olan parçalar "stale" olarak raporlanır;
+onlar normal /analyze akışıyla yeniden yüklenmelidir.
+
+HPSS modu (tempo/key kayıtlarının anahtarında) varsayılan olarak her parçanın
+kayıtlı olduğu moddan alınır; --hpss-mode ile sabitlenebilir (o modda kaydı
+olmayan parçalar stale olur).
+
+    FEATURE_STORE_DIR=/data/features python -m tools.replay_store --out results.jsonl
+    FEATURE_STORE_DIR=/data/features python -m tools.replay_store --preset fast --out results.jsonl
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import List
+
+from app.pipeline.hpss import HPSS_MODES
+from app.services.analyzer_service import AnalyzerService
+from app.services.feature_store import AudioUnavailable, get_feature_store
+
+
+def _replay_one(audio_hash: str, preset: str = "full", hpss_mode: str | None = None) -> dict:
+    try:
+        result = AnalyzerService().reanalyze(audio_hash, preset=preset, hpss_mode=hpss_mode)
+        return {"audio_hash": audio_hash, "status": "ok", "result": result}
+    except AudioUnavailable as e:
+        return {"audio_hash": audio_hash, "status": "stale", "error": str(e)}
+    except Exception as e:
+        return {"audio_hash": audio_hash, "status": "error", "error": f"{type(e).__name__}: {e}"}
+
+
+def main(argv: List[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Replay analysis from the feature store")
+    ap.add_argument("--out", required=True, help="JSONL çıktı (satır başına bir parça)")
+    ap.add_argument("--jobs", type=int, default=1, help="paralel process sayısı")
+    ap.add_argument("--limit", type=int, default=None)
+    ap.add_argument("--preset", choices=("fast", "full"), default="full")
+    ap.add_argument("--hpss-mode", choices=HPSS_MODES, default=None, help="varsayılan: parçanın kayıtlı modu")
+    args = ap.parse_args(argv)
+
+    store = get_feature_store()
+    if store is None:
+        print("FEATURE_STORE_DIR is not set", file=sys.stderr)
+        return 2
+
+    hashes = list(store.hashes())
+    if args.limit is not None:
+        hashes = hashes[: args.limit]
+
+    replay = partial(_replay_one, preset=args.preset, hpss_mode=args.hpss_mode)
+    t0 = time.perf_counter()
+    counts = {"ok": 0, "stale": 0, "error": 0}
+    with open(args.out, "w") as f:
+        if args.jobs > 1:
+            with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+                rows = pool.map(replay, hashes, chunksize=64)
+                for row in rows:
+                    counts[row["status"]] += 1
+                    f.write(json.dumps(row) + "\n")
+        else:
+            for h in hashes:
+                row = replay(h)
+                counts[row["status"]] += 1
+                f.write(json.dumps(row) + "\n")
+
+    print(json.dumps({"tracks": len(hashes), **counts, "seconds": time.perf_counter() - t0}), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())